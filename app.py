@@ -1,29 +1,116 @@
-from flask import Flask, render_template, request, flash, url_for, redirect, jsonify
+from flask import Flask, render_template, request, flash, url_for, redirect, jsonify, Response, stream_with_context
+import click
+import json
+import os
 import re
-from datetime import datetime, timedelta
-from models import db, User, Article, Comment
-from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import date, datetime, timedelta
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy import func, select
+from models import db, User, Article, Comment, make_preview
+from cache import Cache
+from config import get_config
+from database import engine_options, configure_sqlite
+from migrations import migrate
+from pagination import paginate, InvalidCursor
+from serializers import (with_author, without_text, article_to_view, article_to_json, article_to_event,
+                         comment_to_json, validate_article_payload, validate_comment_payload,
+                         ARTICLE_FIELDS, COMMENT_FIELDS, select_article_fields, select_comment_fields)
+from filters import (filter_articles, filter_comments, comment_order, parse_ids, parse_fields,
+                     in_requested_order, InvalidFilter)
+import search as fulltext
+import bulk
+from conditional import conditional
+from page_cache import PageCache
+from passwords import PasswordHasher, RateLimiter, HasherBusy
+from user_cache import UserCache
+from metrics import Metrics
+from events import Events
+from tasks import TaskQueue
+from mail import Mailer
+from assets import Assets, build as build_assets
+from rankings import Rankings
+from replicas import Replicas
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///fefnews.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = '123456'
 
-db.init_app(app)
+cache = Cache()
+page_cache = PageCache()
+hasher = PasswordHasher()
+user_cache = UserCache()
+metrics = Metrics()
+events = Events()
+tasks = TaskQueue()
+mailer = Mailer()
+assets = Assets()
+rankings = Rankings()
+replicas = Replicas()
+ip_limiter = RateLimiter('LOGIN_IP_LIMIT')
+account_limiter = RateLimiter('LOGIN_ACCOUNT_LIMIT')
 
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Пожалуйста, войдите для доступа к странице.'
 
+
+# Маршруты регистрируются на модульном app при импорте, а конфигурация и
+# расширения подключаются здесь один раз на процесс: из wsgi.py, из CLI
+# (flask --app wsgi ...) или из __main__.
+def create_app(config_object=None, **overrides):
+    if 'sqlalchemy' in app.extensions:
+        return app
+
+    app.config.from_object(config_object or get_config())
+    app.config.update(overrides)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    if app.config['TRUSTED_PROXIES']:
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
+    db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine, app.config)
+        metrics.init_app(app, db.engine)
+    replicas.init_app(app, db)
+    for engine in replicas.engines:
+        metrics.watch(engine)
+
+    cache.init_app(app)
+    page_cache.init_app(app)
+    hasher.init_app(app)
+    ip_limiter.init_app(app)
+    account_limiter.init_app(app)
+    user_cache.init_app(app)
+    events.init_app(app)
+    tasks.init_app(app)
+    mailer.init_app(app)
+    assets.init_app(app)
+    rankings.init_app(app, schedule=lambda: tasks.enqueue('compact_rankings'))
+    login_manager.init_app(app)
+    configure_templates()
+    return app
+
+
+# Скомпилированные шаблоны кешируются на диске (flask compile-templates
+# заполняет кеш при деплое), и новый воркер не разбирает их заново на
+# первых запросах. Запись в кеше привязана к хешу исходника шаблона.
+def configure_templates():
+    directory = app.config['TEMPLATE_CACHE_DIR']
+    if directory:
+        directory = os.path.join(app.instance_path, directory)
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.get(int(user_id))
 
-def init_db():
+def init_db(log=None):
     with app.app_context():
         db.create_all() 
+        migrate(db.engine, log=log)
 
         test_user = User.query.filter_by(email='bich@mail.ru').first()
         if not test_user:
@@ -70,34 +157,237 @@ def init_db():
                 db.session.add(article)
             
             db.session.commit()
+            article_changed()
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    init_db(log=click.echo)
+    click.echo('Database schema is ready')
+
+
+@app.cli.command('compile-templates')
+def compile_templates():
+    bytecode_cache = app.jinja_env.bytecode_cache
+    if bytecode_cache is None:
+        click.echo('TEMPLATE_CACHE_DIR is empty, nothing to compile')
+        return
+    bytecode_cache.clear()
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    click.echo(f'Compiled {len(names)} templates into {bytecode_cache.directory}')
+
+
+@app.cli.command('db-upgrade')
+def db_upgrade():
+    applied = migrate(db.engine, log=click.echo)
+    if not applied:
+        click.echo('Database schema is up to date')
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    build_assets(app.static_folder, app.config['ASSET_IMAGE_WIDTHS'], app.config['ASSET_IMAGE_QUALITY'],
+                 log=click.echo)
+    assets.load()
+
+
+@app.cli.command('compact-rankings')
+@click.option('--rebuild', is_flag=True, help='Recount comments in the window from the comment table.')
+def compact_rankings_command(rebuild):
+    if rebuild:
+        rankings.rebuild()
+    removed = rankings.compact()
+    click.echo(f'Removed {removed} expired counter buckets')
+
+
+@app.cli.command('refresh-replicas')
+def refresh_replicas_command():
+    if not replicas.replicas:
+        click.echo('DB_REPLICAS is empty, nothing to refresh')
+        return
+    refreshed = replicas.refresh(force=True)
+    click.echo(f'Refreshed {refreshed} of {len(replicas.replicas)} replicas')
+
+
+@app.cli.command('tasks-worker')
+@click.option('--processes', default=1, show_default=True, help='Number of worker processes.')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+def tasks_worker(processes, burst):
+    tasks.run_workers(processes, burst)
+
+
+@app.cli.command('import-ndjson')
+@click.argument('kind', type=click.Choice(['articles', 'comments']))
+@click.argument('source', type=click.File('rb'), default='-')
+def import_ndjson(kind, source):
+    if kind == 'articles':
+        results = bulk.import_articles(source, app.config['BULK_BATCH_SIZE'], on_commit=articles_imported)
+    else:
+        results = bulk.import_comments(source, app.config['BULK_BATCH_SIZE'], on_commit=comments_imported)
+
+    for result in bulk.with_summary(results):
+        if result.get('status') != 'created':
+            click.echo(json.dumps(result, ensure_ascii=False), err='errors' in result)
+
+
+@app.cli.command('export-ndjson')
+@click.argument('kind', type=click.Choice(['articles', 'comments']))
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+def export_ndjson(kind, target):
+    items = bulk.export_articles if kind == 'articles' else bulk.export_comments
+    for line in bulk.to_ndjson(items(app.config['BULK_BATCH_SIZE'])):
+        target.write(line)
+
+
+@app.cli.command('backfill-previews')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--all', 'rebuild', is_flag=True, help='Recompute previews for every article.')
+def backfill_previews(batch_size, rebuild):
+    updated = 0
+    last_id = 0
+    while True:
+        query = db.session.query(Article).filter(Article.id > last_id)
+        if not rebuild:
+            query = query.filter(Article.preview.is_(None))
+        articles = query.order_by(Article.id).limit(batch_size).all()
+        if not articles:
+            break
+        for article in articles:
+            article.preview = make_preview(article.text)
+        db.session.commit()
+        last_id = articles[-1].id
+        updated += len(articles)
+    click.echo(f'Updated previews for {updated} articles')
 
 
-def get_articles(category=None):
-    query = Article.query
+def get_articles(category=None, cursor=None, limit=None):
+    query = without_text(with_author(Article.query))
     
     if category:
         query = query.filter_by(category=category)
     
-    articles_from_db = query.order_by(Article.created_date.desc()).all()
-    
-    articles = []
-    for article in articles_from_db:
-        articles.append({
-            'id': article.id,
-            'title': article.title,
-            'date': article.created_date,
-            'preview': article.text[:100] + '...' if len(article.text) > 100 else article.text,
-            'content': article.text,
-            'author': article.author.name,  
-            'category': article.category
-        })
+    page = paginate(query, cursor=cursor, limit=limit or app.config['ARTICLES_PER_PAGE'])
     
-    return articles
+    return page._replace(items=[article_to_view(article, with_content=False) for article in page.items])
+
+
+def get_comments_page(article_id, cursor=None, limit=None, fields=None):
+    query = select_comment_fields(Comment.query.filter_by(article_id=article_id), fields)
+    return paginate(query, cursor=cursor,
+                    limit=limit or app.config['COMMENTS_PER_PAGE'],
+                    sort_column=Comment.date, id_column=Comment.id)
 
 
 def get_categories():
-    categories = db.session.query(Article.category).distinct().all()
-    return [category[0] for category in categories]
+    categories = cache.get('categories')
+    if categories is None:
+        rows = db.session.query(Article.category).distinct().all()
+        categories = [category[0] for category in rows]
+        cache.set('categories', categories, ttl=app.config['CATEGORY_CACHE_TTL'])
+    return categories
+
+
+def invalidate_categories():
+    cache.delete('categories')
+
+
+def article_changed(article_id=None):
+    invalidate_categories()
+    if article_id is None:
+        page_cache.invalidate('articles')
+    else:
+        page_cache.invalidate('articles', f'news:{article_id}')
+
+
+def comment_changed(article_id):
+    page_cache.invalidate('articles', f'news:{article_id}')
+
+
+# Клиенты SSE получают только изменения: события по статье идут в канал
+# article:<id>, изменения списков - в category:<категория>.
+# Публикация остаётся в запросе, а не в очереди задач: брокер в памяти
+# (EVENTS_URL = memory://) виден только этому процессу, а у общего
+# брокера sqlite:/// публикация - одна вставка, столько же стоила бы
+# постановка задачи. Почта (send_feedback) уходит через tasks.
+def publish_article(event_type, data, *categories):
+    events.publish(f'article:{data["id"]}', event_type, data)
+    for category in set(categories or [data['category']]):
+        events.publish(f'category:{category}', event_type, data)
+
+
+def publish_comment(event_type, data):
+    data['comment_count'] = db.session.query(Article.comment_count) \
+        .filter_by(id=data['article_id']).scalar()
+    events.publish(f'article:{data["article_id"]}', event_type, data)
+
+
+def listing_tags(category=None):
+    return ['articles']
+
+
+# блоки рейтингов на главной обновляются после каждого сжатия счётчиков:
+# время сжатия берётся из базы, поэтому его видят все воркеры
+def index_tags():
+    return ['articles', f'rankings:{rankings.compacted_at()}']
+
+
+def news_tags(id):
+    return [f'news:{id}']
+
+
+def articles_state(category=None):
+    query = db.session.query(func.count(Article.id), func.max(Article.updated_at))
+    if category:
+        query = query.filter(Article.category == category)
+    return query.one()
+
+
+# число комментариев ведут триггеры (comment_count), а последнюю правку
+# отдаёт индекс (article_id, updated_at) одним шагом, без прохода по всем
+def last_comment_update(article_id):
+    return db.session.query(func.max(Comment.updated_at)) \
+        .filter(Comment.article_id == article_id).scalar_subquery()
+
+
+# HTML-страницы зависят ещё и от пользователя в шапке и от значка "Новое!"
+def page_validator(category=None):
+    count, updated = articles_state()
+    return (count, updated, current_user.get_id(), date.today()), updated
+
+
+def index_validator():
+    state, updated = page_validator()
+    return state + (rankings.compacted_at(),), updated
+
+
+def news_validator(id):
+    state = db.session.query(Article.updated_at, Article.comment_count, last_comment_update(id)) \
+        .filter_by(id=id).first()
+    if state is None:
+        return None
+    updated, count, comments_updated = state
+    last_modified = max(updated, comments_updated) if comments_updated else updated
+    return (updated, count, comments_updated, current_user.get_id()), last_modified
+
+
+def api_articles_validator(category=None):
+    count, updated = articles_state(category)
+    return (count, updated), updated
+
+
+# JSON-страница и NDJSON-выгрузка по одному URL - разные представления
+def api_articles_list_validator():
+    state, updated = api_articles_validator()
+    return state + (negotiated_type(),), updated
+
+
+def api_article_validator(id):
+    updated = db.session.query(Article.updated_at).filter_by(id=id).scalar()
+    if updated is None:
+        return None
+    return updated, updated
 
 
 @app.context_processor
@@ -116,39 +406,68 @@ def inject_current_user():
     return {'current_user': current_user}
 
 
-<<<<<<< HEAD
-=======
+@app.errorhandler(InvalidCursor)
+def handle_invalid_cursor(error):
+    if request.path.startswith('/api/'):
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return redirect(request.path)
+
+
+@app.errorhandler(InvalidFilter)
+def handle_invalid_filter(error):
+    return jsonify({'error': str(error)}), 400
+
+
+def get_api_page(query, descending=True):
+    limit = request.args.get('limit', app.config['API_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+    return paginate(query, cursor=request.args.get('cursor'), limit=limit, descending=descending)
+
+
+# ?fields=, ?author_id=, ?category=, ?since=, ?until= для списков статей
+def api_articles_query(query):
+    fields = parse_fields(request.args.get('fields'), ARTICLE_FIELDS)
+    return select_article_fields(filter_articles(query, request.args), fields), fields
+
+
+def api_ids():
+    return parse_ids(request.args.get('ids'), app.config['API_MAX_PAGE_SIZE'])
+
+
+def api_articles_page(page, fields):
+    result = [article_to_json(article, fields) for article in page.items]
+    return jsonify({'articles': result, 'next': page.next_cursor, 'prev': page.prev_cursor})
+
+
 @app.route('/api/articles', methods=['GET'])
+@conditional(api_articles_list_validator, vary='Accept')
 def api_get_articles():
-    
-    articles = Article.query.all()
-    result = []
-    for article in articles:
-        result.append({
-            'id': article.id,
-            'title': article.title,
-            'text': article.text,
-            'category': article.category,
-            'author': article.author.name,  
-            'author_id': article.user_id,   
-            'created_date': article.created_date.isoformat()
-        })
-    return jsonify(result)
+
+    # ?ids=1,2,3 - пачка статей одним запросом IN (...) в запрошенном порядке
+    ids = api_ids()
+    if ids:
+        query, fields = api_articles_query(Article.query)
+        articles = in_requested_order(query.filter(Article.id.in_(ids)).all(), ids)
+        return jsonify({'articles': [article_to_json(article, fields) for article in articles],
+                        'next': None, 'prev': None})
+
+    if wants_ndjson() or request.args.get('all'):
+        query, fields = api_articles_query(select(Article))
+        return streamed_response(bulk.export_articles(
+            app.config['BULK_BATCH_SIZE'], newest_first=True, query=query,
+            serialize=lambda article: article_to_json(article, fields)))
+
+    query, fields = api_articles_query(Article.query)
+    return api_articles_page(get_api_page(query), fields)
 
 
 @app.route('/api/articles/<int:id>', methods=['GET'])
+@conditional(api_article_validator)
 def api_get_article(id):
-    
-    article = Article.query.get_or_404(id)
-    return jsonify({
-        'id': article.id,
-        'title': article.title,
-        'text': article.text,
-        'category': article.category,
-        'author': article.author.name,      
-        'author_id': article.user_id,       
-        'created_date': article.created_date.isoformat()
-    })
+
+    fields = parse_fields(request.args.get('fields'), ARTICLE_FIELDS)
+    article = select_article_fields(Article.query, fields).filter_by(id=id).first_or_404()
+    return jsonify(article_to_json(article, fields))
 
 
 @app.route('/api/articles', methods=['POST'])
@@ -160,15 +479,7 @@ def api_create_article():
         return jsonify({'error': 'No JSON data provided'}), 400
     
 
-    errors = {}
-    if not data.get('title') or not data['title'].strip():
-        errors['title'] = 'Title is required'
-    if not data.get('text') or not data['text'].strip():
-        errors['text'] = 'Text is required'
-    if not data.get('category') or not data['category'].strip():
-        errors['category'] = 'Category is required'
-    if not data.get('author_id'):
-        errors['author_id'] = 'Author ID is required'
+    errors = validate_article_payload(data)
     
     if errors:
         return jsonify({'errors': errors}), 400
@@ -189,21 +500,16 @@ def api_create_article():
     
     db.session.add(article)
     db.session.commit()
+    article_changed(article.id)
+    publish_article('article_created', article_to_event(article))
     
-    return jsonify({
-        'id': article.id,
-        'title': article.title,
-        'text': article.text,
-        'category': article.category,
-        'author': article.author.name,      
-        'created_date': article.created_date.isoformat()
-    }), 201
+    return jsonify(article_to_json(article)), 201
 
 
 @app.route('/api/articles/<int:id>', methods=['PUT'])
 def api_update_article(id):
 
-    article = Article.query.get_or_404(id)
+    article = with_author(Article.query).get_or_404(id)
     data = request.get_json()
     
     if not data:
@@ -222,6 +528,7 @@ def api_update_article(id):
         return jsonify({'errors': errors}), 400
     
 
+    old_category = article.category
     if 'title' in data:
         article.title = data['title'].strip()
     if 'text' in data:
@@ -230,103 +537,90 @@ def api_update_article(id):
         article.category = data['category'].strip()
     
     db.session.commit()
+    article_changed(id)
+    publish_article('article_updated', article_to_event(article), old_category, article.category)
     
-    return jsonify({
-        'id': article.id,
-        'title': article.title,
-        'text': article.text,
-        'category': article.category,
-        'author': article.author.name,      
-        'created_date': article.created_date.isoformat()
-    })
+    return jsonify(article_to_json(article))
 
 
 @app.route('/api/articles/<int:id>', methods=['DELETE'])
 def api_delete_article(id):
     
     article = Article.query.get_or_404(id)
+    deleted = {'id': article.id, 'category': article.category}
     
     db.session.delete(article)
     db.session.commit()
+    article_changed(id)
+    publish_article('article_deleted', deleted)
     
     return jsonify({'message': 'Article deleted successfully'})
 
 
 @app.route('/api/articles/category/<category>', methods=['GET'])
+@conditional(api_articles_validator)
 def api_get_articles_by_category(category):
     
-    articles = Article.query.filter_by(category=category).all()
+    query, fields = api_articles_query(Article.query.filter_by(category=category))
+    page = get_api_page(query)
     
-    if not articles:
+    if not page.items and not request.args.get('cursor'):
         return jsonify({'error': f'No articles found in category: {category}'}), 404
     
-    result = []
-    for article in articles:
-        result.append({
-            'id': article.id,
-            'title': article.title,
-            'text': article.text,
-            'category': article.category,
-            'author': article.author.name,  
-            'created_date': article.created_date.isoformat()
-        })
-    
-    return jsonify(result)
+    return api_articles_page(page, fields)
 
 
 @app.route('/api/articles/sort/date', methods=['GET'])
+@conditional(api_articles_validator)
 def api_get_articles_sorted_by_date():
     
     sort_order = request.args.get('order', 'desc')  
     
-    if sort_order == 'asc':
-        articles = Article.query.order_by(Article.created_date.asc()).all()
-    else:
-        articles = Article.query.order_by(Article.created_date.desc()).all()
-    
-    result = []
-    for article in articles:
-        result.append({
-            'id': article.id,
-            'title': article.title,
-            'text': article.text,
-            'category': article.category,
-            'author': article.author.name,  
-            'created_date': article.created_date.isoformat()
-        })
+    query, fields = api_articles_query(Article.query)
+    page = get_api_page(query, descending=sort_order != 'asc')
     
-    return jsonify(result)
+    return api_articles_page(page, fields)
 
 
 @app.route('/api/comment', methods=['GET'])
 def api_get_comments():
 
-    comments = Comment.query.all()
-    result = []
-
-    for comment in comments:
-        result.append({
-            'id': comment.id,
-            'text': comment.text,
-            'author_name': comment.author_name,
-            'article_id': comment.article_id,
-            'date': comment.date.isoformat()
-        })
-        
-    return jsonify(result)
+    fields = parse_fields(request.args.get('fields'), COMMENT_FIELDS)
+    query = select_comment_fields(filter_comments(select(Comment), request.args), fields)
+
+    ids = api_ids()
+    if ids:
+        comments = in_requested_order(db.session.scalars(query.filter(Comment.id.in_(ids))).all(), ids)
+        return streamed_response(comment_to_json(comment, fields) for comment in comments)
+
+    return streamed_response(bulk.export_comments(
+        app.config['BULK_BATCH_SIZE'], query=query, order=comment_order(request.args),
+        serialize=lambda comment: comment_to_json(comment, fields)))
+
+
+@app.route('/api/articles/<int:id>/comments', methods=['GET'])
+def api_get_article_comments(id):
+
+    if not db.session.query(Article.id).filter_by(id=id).scalar():
+        return jsonify({'error': 'Article not found'}), 404
+
+    fields = parse_fields(request.args.get('fields'), COMMENT_FIELDS)
+    limit = request.args.get('limit', app.config['COMMENTS_PER_PAGE'], type=int)
+    limit = max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+    page = get_comments_page(id, request.args.get('cursor'), limit, fields)
+
+    return jsonify({
+        'comments': [comment_to_json(comment, fields) for comment in page.items],
+        'next': page.next_cursor,
+        'prev': page.prev_cursor
+    })
 
 
 @app.route('/api/comment/<int:id>', methods=['GET'])
 def api_get_comment(id):
 
     comment = Comment.query.get_or_404(id)
-    return jsonify({
-        'id': comment.id,
-        'text': comment.text,
-        'author_name': comment.author_name,
-        'article_id': comment.article_id,
-        'date': comment.date.isoformat()
-    })
+    return jsonify(comment_to_json(comment))
 
 
 @app.route('/api/comment', methods=['POST'])
@@ -338,16 +632,7 @@ def api_create_comment():
         return jsonify({'error': 'No JSON data provided'}), 400
     
 
-    errors = {}
-    if not data.get('text') or not data['text'].strip():
-        errors['text'] = 'Text is required'
-
-    if not data.get('author_name') or not data['author_name'].strip():
-        errors['author_name'] = 'Author name is required'
-
-    if not data.get('article_id'):
-        errors['article_id'] = 'Article ID is required'
-    
+    errors = validate_comment_payload(data)
 
     if errors:
         return jsonify({'errors': errors}), 400
@@ -367,14 +652,10 @@ def api_create_comment():
     
     db.session.add(comment)
     db.session.commit()
+    comment_changed(comment.article_id)
+    publish_comment('comment_created', comment_to_json(comment))
     
-    return jsonify({
-        'id': comment.id,
-        'text': comment.text,
-        'author_name': comment.author_name,
-        'article_id': comment.article_id,
-        'date': comment.date.isoformat()
-    }), 201
+    return jsonify(comment_to_json(comment)), 201
 
 
 @app.route('/api/comment/<int:id>', methods=['PUT'])
@@ -404,29 +685,217 @@ def api_update_comment(id):
         comment.author_name = data['author_name'].strip()
     
     db.session.commit()
+    comment_changed(comment.article_id)
+    publish_comment('comment_updated', comment_to_json(comment))
     
-    return jsonify({
-        'id': comment.id,
-        'text': comment.text,
-        'author_name': comment.author_name,
-        'article_id': comment.article_id,
-        'date': comment.date.isoformat()
-    })
+    return jsonify(comment_to_json(comment))
 
 
 @app.route('/api/comment/<int:id>', methods=['DELETE'])
 def api_delete_comment(id):
 
     comment = Comment.query.get_or_404(id)
+    deleted = {'id': comment.id, 'article_id': comment.article_id}
     
     db.session.delete(comment)
     db.session.commit()
+    comment_changed(comment.article_id)
+    publish_comment('comment_deleted', deleted)
     
     return jsonify({'message': 'Comment deleted successfully'})
 
 
+# после пачки импорта клиентам отправляется reset вместо сотен отдельных событий
+def articles_imported(ids):
+    article_changed()
+    categories = db.session.query(Article.category).filter(Article.id.in_(ids)).distinct()
+    for (category,) in categories:
+        events.publish(f'category:{category}', 'reset', {})
+
+
+def comments_imported(article_ids):
+    for article_id in article_ids:
+        comment_changed(article_id)
+        events.publish(f'article:{article_id}', 'reset', {})
+
+
+def ndjson_response(items):
+    return Response(stream_with_context(bulk.buffered(bulk.to_ndjson(items))),
+                    mimetype='application/x-ndjson')
+
+
+def wants_ndjson():
+    return negotiated_type() == 'application/x-ndjson'
+
+
+def negotiated_type():
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return best or 'application/json'
+
+
+# Полные выгрузки идут потоком прямо из курсора (yield_per), поэтому
+# память не зависит от размера таблицы: массив JSON по умолчанию или
+# NDJSON, если клиент прислал Accept: application/x-ndjson.
+def streamed_response(items):
+    if wants_ndjson():
+        response = ndjson_response(items)
+    else:
+        response = Response(stream_with_context(bulk.buffered(bulk.to_json_array(items))),
+                            mimetype='application/json')
+    response.vary.add('Accept')
+    return response
+
+
+@app.route('/api/articles/bulk', methods=['POST'])
+def api_import_articles():
+
+    results = bulk.import_articles(request.stream, app.config['BULK_BATCH_SIZE'],
+                                   on_commit=articles_imported)
+    return ndjson_response(bulk.with_summary(results))
+
+
+@app.route('/api/articles/export', methods=['GET'])
+def api_export_articles():
+
+    return ndjson_response(bulk.export_articles(app.config['BULK_BATCH_SIZE']))
+
+
+@app.route('/api/comment/bulk', methods=['POST'])
+def api_import_comments():
+
+    results = bulk.import_comments(request.stream, app.config['BULK_BATCH_SIZE'],
+                                   on_commit=comments_imported)
+    return ndjson_response(bulk.with_summary(results))
+
+
+@app.route('/api/comment/export', methods=['GET'])
+def api_export_comments():
+
+    return ndjson_response(bulk.export_comments(app.config['BULK_BATCH_SIZE']))
+
+
+@app.route('/api/search', methods=['GET'])
+def api_search():
+
+    query = request.args.get('q', '').strip()
+    scope = request.args.get('scope', 'articles')
+    page = max(1, request.args.get('page', 1, type=int))
+    limit = request.args.get('limit', app.config['SEARCH_PER_PAGE'], type=int)
+    limit = max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+
+    if not query:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    if scope not in fulltext.SCOPES:
+        return jsonify({'error': f'Unknown scope: {scope}'}), 400
+
+    results, has_more = fulltext.search(query, scope=scope, page=page, per_page=limit)
+
+    return jsonify({
+        'query': query,
+        'scope': scope,
+        'page': page,
+        'has_more': has_more,
+        'results': [fulltext.result_to_json(result) for result in results]
+    })
+
+
+# Поток не оборачивается в stream_with_context: соединение живёт долго,
+# и держать на нём контекст приложения и сессию базы незачем.
+def event_stream(*channels):
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    response = Response(events.stream(channels, last_event_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/articles/<int:id>/events', methods=['GET'])
+def api_article_events(id):
+
+    if not db.session.query(Article.id).filter_by(id=id).scalar():
+        return jsonify({'error': 'Article not found'}), 404
+    return event_stream(f'article:{id}')
+
+
+@app.route('/api/articles/category/<category>/events', methods=['GET'])
+def api_category_events(category):
+
+    return event_stream(f'category:{category}')
+
+
+@tasks.task('compact_rankings')
+def compact_rankings():
+    rankings.compact()
+
+
+@app.template_global()
+def top_articles(kind, category=None, limit=5):
+    return [dict(article_to_view(article, with_content=False), score=score)
+            for article, score in rankings.top(kind, category, limit)]
+
+
+def api_ranking(kind):
+    limit = request.args.get('limit', 10, type=int)
+    limit = max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+    top = rankings.top(kind, request.args.get('category'), limit)
+    return jsonify({
+        'articles': [dict(article_to_json(article), score=score) for article, score in top],
+        'window_hours': rankings.window
+    })
+
+
+@app.route('/api/articles/trending', methods=['GET'])
+def api_trending_articles():
+
+    return api_ranking('views')
+
+
+@app.route('/api/articles/most-discussed', methods=['GET'])
+def api_most_discussed_articles():
+
+    return api_ranking('comments')
+
+
+@app.route('/api/stats/user-cache', methods=['GET'])
+def api_user_cache_stats():
+    return jsonify(user_cache.stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    stats = user_cache.stats()
+    task_counts = tasks.stats()
+    views = rankings.views.stats()
+    reads = replicas.stats()
+    body = metrics.render([
+        ('user_cache_hits_total', 'counter', 'current_user loads served from cache', stats['hits']),
+        ('user_cache_misses_total', 'counter', 'current_user loads that queried the database', stats['misses']),
+        ('tasks_queued', 'gauge', 'Background tasks waiting to run', task_counts['queued']),
+        ('tasks_running', 'gauge', 'Background tasks claimed by a worker', task_counts['running']),
+        ('tasks_failed', 'gauge', 'Background tasks that ran out of attempts', task_counts['failed']),
+        ('view_buffer_pending', 'gauge', 'Article views buffered but not yet written', views['pending']),
+        ('view_buffer_keys', 'gauge', 'Articles with buffered views', views['keys']),
+        ('view_buffer_oldest_seconds', 'gauge', 'Age of the oldest unwritten view',
+         f"{views['oldest_seconds']:.3f}"),
+        ('view_buffer_flushes_total', 'counter', 'Successful view buffer flushes', views['flushes']),
+        ('view_buffer_flushed_total', 'counter', 'Article views written by flushes', views['flushed']),
+        ('view_buffer_flush_errors_total', 'counter', 'View buffer flushes that failed', views['errors']),
+        ('view_buffer_flush_seconds', 'histogram', 'Time to write one view buffer flush',
+         views['flush_seconds']),
+        ('db_replica_lag_seconds', 'gauge', 'Age of the oldest replica snapshot', f"{reads['lag_seconds']:.3f}"),
+        ('db_replica_reads_total', 'counter', 'Read requests routed to a replica', reads['replica_reads']),
+        ('db_primary_reads_total', 'counter', 'Read requests kept on the primary', reads['primary_reads']),
+        ('db_replica_refreshes_total', 'counter', 'Replica snapshots taken by this process', reads['refreshes']),
+        ('db_replica_refresh_errors_total', 'counter', 'Replica snapshots that failed', reads['refresh_errors'])
+    ])
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+
+TOO_MANY_ATTEMPTS = 'Слишком много попыток. Попробуйте позже.'
+SERVER_BUSY = 'Сервер перегружен, попробуйте ещё раз через несколько секунд.'
+
 
->>>>>>> new_api_1
 @app.route("/register", methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
@@ -466,11 +935,24 @@ def register():
         if errors:
             return render_template('register.html', errors=errors, name=name, email=email)
         
+        if ip_limiter.is_limited(request.remote_addr):
+            errors['register'] = TOO_MANY_ATTEMPTS
+            return render_template('register.html', errors=errors, name=name, email=email), 429
+        ip_limiter.hit(request.remote_addr)
+
+        # хеш нужен до записи пользователя, поэтому не уходит в очередь
+        # задач; считается он в пуле hasher, а не в потоке запроса
+        try:
+            hashed_password = hasher.hash(password)
+        except HasherBusy:
+            errors['register'] = SERVER_BUSY
+            return render_template('register.html', errors=errors, name=name, email=email), 503
+
         user = User(
             name=name,
-            email=email
+            email=email,
+            hashed_password=hashed_password
         )
-        user.set_password(password)  
         
         db.session.add(user)
         db.session.commit()
@@ -501,15 +983,34 @@ def login():
         if errors:
             return render_template('login.html', errors=errors, email=email)
         
+        account = email.lower()
+        if ip_limiter.is_limited(request.remote_addr) or account_limiter.is_limited(account):
+            errors['login'] = TOO_MANY_ATTEMPTS
+            return render_template('login.html', errors=errors, email=email), 429
+        ip_limiter.hit(request.remote_addr)
+
         user = User.query.filter_by(email=email).first()
-        
-        if user and user.check_password(password):  
+        try:
+            if user:
+                valid = hasher.verify(user.hashed_password, password)
+            else:
+                valid = hasher.verify_dummy(password)
+            if valid and hasher.needs_rehash(user.hashed_password):
+                user.hashed_password = hasher.hash(password)
+                db.session.commit()
+        except HasherBusy:
+            errors['login'] = SERVER_BUSY
+            return render_template('login.html', errors=errors, email=email), 503
+
+        if valid:
+            account_limiter.reset(account)
             login_user(user, remember=remember)
             flash(f'Добро пожаловать, {user.name}!', 'success')
             
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('index'))
         else:
+            account_limiter.hit(account)
             errors['login'] = 'Неверный email или пароль'
             return render_template('login.html', errors=errors, email=email)
     
@@ -524,9 +1025,11 @@ def logout():
 
 
 @app.route("/")
+@conditional(index_validator)
+@page_cache.cached(index_tags)
 def index():
-    articles = get_articles()
-    return render_template('index.html', articles=articles)
+    page = get_articles(cursor=request.args.get('cursor'))
+    return render_template('index.html', articles=page.items, page=page)
 
 
 @app.route("/about")
@@ -539,6 +1042,12 @@ def contact():
     return render_template('contact.html')
 
 
+@tasks.task('send_feedback')
+def send_feedback(username, usermail, textmess):
+    mailer.send(app.config['FEEDBACK_EMAIL'], f'Обратная связь от {username}',
+                f'{username} <{usermail}>:\n\n{textmess}', reply_to=usermail)
+
+
 @app.route("/feedback", methods=['POST','GET'])
 def feedback():
     if request.method == 'POST':
@@ -561,35 +1070,32 @@ def feedback():
         if errors:
             return render_template('feedback.html', errors=errors, username=username, usermail=usermail, textmess=textmess)
         
+        tasks.enqueue('send_feedback', username, usermail, textmess)
         flash('Сообщение успешно отправлено! Спасибо за обратную связь.', 'success')
-        return render_template('post_feedback.html', errors=errors, username=username, usermail=usermail, textmess=textmess)
+        return render_template('page_after_feedback.html', errors=errors, username=username, usermail=usermail, textmess=textmess)
     else:
         return render_template('feedback.html')
 
 
 @app.route('/news/<int:id>')
+@rankings.counts_views
+@conditional(news_validator)
+@page_cache.cached(news_tags)
 def news(id):
-    article = Article.query.get_or_404(id)
+    article = with_author(Article.query).get_or_404(id)
 
-    comments = Comment.query.filter_by(article_id=id).order_by(Comment.date.desc()).all()
+    comments = get_comments_page(id, request.args.get('comments_cursor'))
     
-    article_data = {
-        'id': article.id,
-        'title': article.title,
-        'date': article.created_date,
-        'preview': article.text[:100] + '...' if len(article.text) > 100 else article.text,
-        'content': article.text,
-        'author': article.author.name,  
-        'category': article.category
-    }
+    article_data = article_to_view(article)
     
-    return render_template('news_detail.html', article=article_data, comments=comments)
+    return render_template('news_detail.html', article=article_data,
+                           comments=comments.items, comments_page=comments)
 
 
 @app.route('/add-comment/<int:article_id>', methods=['POST'])
 @login_required 
 def add_comment(article_id):
-    article = Article.query.get_or_404(article_id)
+    article = with_author(Article.query).get_or_404(article_id)
     
     author_name = current_user.name  
     
@@ -600,19 +1106,12 @@ def add_comment(article_id):
         errors['comment_text'] = 'Обязательно введите текст комментария'
     
     if errors:
-        comments = Comment.query.filter_by(article_id=article_id).order_by(Comment.date.desc()).all()
-        article_data = {
-            'id': article.id,
-            'title': article.title,
-            'date': article.created_date,
-            'preview': article.text[:100] + '...' if len(article.text) > 100 else article.text,
-            'content': article.text,
-            'author': article.author.name, 
-            'category': article.category
-        }
+        comments = get_comments_page(article_id)
+        article_data = article_to_view(article)
         return render_template('news_detail.html', 
                              article=article_data, 
-                             comments=comments,
+                             comments=comments.items,
+                             comments_page=comments,
                              errors=errors,
                              author_name=author_name,
                              comment_text=comment_text)
@@ -626,6 +1125,8 @@ def add_comment(article_id):
     
     db.session.add(comment)
     db.session.commit()
+    comment_changed(article_id)
+    publish_comment('comment_created', comment_to_json(comment))
 
     return redirect(url_for('news', id=article_id))
 
@@ -663,6 +1164,8 @@ def create_article():
 
         db.session.add(article)
         db.session.commit()
+        article_changed(article.id)
+        publish_article('article_created', article_to_event(article))
         flash('Статья успешно создана!', 'success')
         return redirect(url_for('news', id=article.id))
 
@@ -698,11 +1201,14 @@ def edit_article(id):
         if errors:
             return render_template('edit_article.html', errors=errors, title=title, text=text, category=category, article=article)
 
+        old_category = article.category
         article.title = title
         article.text = text
         article.category = category
         
         db.session.commit()
+        article_changed(id)
+        publish_article('article_updated', article_to_event(article), old_category, article.category)
         return redirect(url_for('news', id=article.id))
 
     return render_template('edit_article.html', article=article)
@@ -717,23 +1223,46 @@ def delete_article(id):
         flash('У вас нет прав для удаления этой статьи!', 'danger')
         return redirect(url_for('news', id=id))
     
+    deleted = {'id': article.id, 'category': article.category}
     db.session.delete(article)
     db.session.commit()
+    article_changed(id)
+    publish_article('article_deleted', deleted)
     return redirect(url_for('index'))
 
 
 @app.route("/articles")
+@conditional(page_validator)
+@page_cache.cached(listing_tags)
 def articles():
     category = request.args.get('category', '').strip()
 
     if category:
         return articles_by_category(category)
     
-    articles = get_articles()
-    return render_template('articles.html', articles=articles)
+    page = get_articles(cursor=request.args.get('cursor'))
+    return render_template('articles.html', articles=page.items, page=page)
+
+
+@app.route("/search")
+def search():
+    query = request.args.get('q', '').strip()
+    scope = request.args.get('scope', 'articles')
+    page = max(1, request.args.get('page', 1, type=int))
+
+    if scope not in fulltext.SCOPES:
+        scope = 'articles'
+
+    results, has_more = fulltext.search(query, scope=scope, page=page,
+                                        per_page=app.config['SEARCH_PER_PAGE'])
+
+    return render_template('search.html', query=query, scope=scope, page=page,
+                           results=results, has_more=has_more)
 
 
 @app.route("/articles/<category>")
+@conditional(page_validator)
+@page_cache.cached(listing_tags)
 def articles_by_category(category):
     valid_categories = get_categories()
     
@@ -741,10 +1270,10 @@ def articles_by_category(category):
         flash(f'Категория "{category}" не найдена!', 'danger')
         return redirect(url_for('articles'))
     
-    articles = get_articles(category=category)
-    return render_template('articles.html', articles=articles, current_category=category)
+    page = get_articles(category=category, cursor=request.args.get('cursor'))
+    return render_template('articles.html', articles=page.items, page=page, current_category=category)
 
 
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True)
\ No newline at end of file
+    create_app()
+    app.run(debug=app.config['DEBUG'])
\ No newline at end of file
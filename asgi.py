@@ -0,0 +1,326 @@
+import hashlib
+import json
+from contextlib import asynccontextmanager
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import undefer
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.exceptions import default_exceptions
+from werkzeug.http import parse_accept_header
+
+from app import create_app
+from database import engine_options, configure_sqlite
+from models import db, Article, Comment
+from pagination import keyset_query, make_page, InvalidCursor
+from serializers import (article_to_json, comment_to_json, ARTICLE_FIELDS, COMMENT_FIELDS,
+                         select_article_fields, select_comment_fields)
+from filters import (filter_articles, filter_comments, comment_order, parse_ids, parse_fields,
+                     in_requested_order, InvalidFilter)
+
+
+# Асинхронный слой только для чтения: те же ответы, что у GET-обработчиков
+# /api/articles* и /api/comment* в app.py, но на asyncio и aiosqlite.
+# Соединение с базой занято только на время запроса, а медленные клиенты
+# и длинные выгрузки ждут в цикле событий, а не держат воркер.
+# Запуск: uvicorn asgi:app (нужны starlette, uvicorn, aiosqlite и greenlet).
+flask_app = create_app()
+config = flask_app.config
+
+with flask_app.app_context():
+    # путь к базе берётся уже разрешённым Flask-SQLAlchemy (instance/...)
+    url = db.engine.url.set(drivername='sqlite+aiosqlite')
+
+engine = create_async_engine(url, **engine_options(config))
+configure_sqlite(engine.sync_engine, config)
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+def error(message, status):
+    return JSONResponse({'error': message}, status_code=status)
+
+
+# там, где Flask отвечает abort/get_or_404 (нет маршрута, статьи или
+# комментария по id), ответ - та же HTML-страница ошибки werkzeug
+def http_error(status, headers=None):
+    body = default_exceptions[status]().get_body()
+    return HTMLResponse(body, status_code=status, headers=headers)
+
+
+def int_arg(request, name, default):
+    try:
+        return int(request.query_params.get(name, default))
+    except ValueError:
+        return default
+
+
+def page_limit(request, default):
+    return max(1, min(int_arg(request, 'limit', default), config['API_MAX_PAGE_SIZE']))
+
+
+# разбор Accept тот же, что у request.accept_mimetypes во Flask (app.negotiated_type)
+def negotiated_type(request):
+    accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+    return accept.best_match(['application/json', 'application/x-ndjson']) or 'application/json'
+
+
+def wants_ndjson(request):
+    return negotiated_type(request) == 'application/x-ndjson'
+
+
+# ETag считается так же, как в conditional.py, поэтому клиент может
+# переходить между синхронным и асинхронным API со своими валидаторами
+def full_path(request):
+    return f'{request.url.path}?{request.url.query}'
+
+
+def conditional(request, state, last_modified, build, vary=None):
+    etag = hashlib.sha1(repr((full_path(request), state)).encode()).hexdigest()
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if vary:
+        headers['Vary'] = vary
+    if last_modified is not None:
+        last_modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+        headers['Last-Modified'] = format_datetime(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get('if-none-match')
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_none_match:
+        tags = {tag.strip().removeprefix('W/').strip('"') for tag in if_none_match.split(',')}
+        not_modified = etag in tags or '*' in tags
+    elif if_modified_since and last_modified is not None:
+        try:
+            not_modified = last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            not_modified = False
+    else:
+        not_modified = False
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response = build()
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
+
+async def articles_state(session, category=None):
+    query = select(func.count(Article.id), func.max(Article.updated_at))
+    if category:
+        query = query.where(Article.category == category)
+    return (await session.execute(query)).one()
+
+
+def articles_query(request, query):
+    fields = parse_fields(request.query_params.get('fields'), ARTICLE_FIELDS)
+    return select_article_fields(filter_articles(query, request.query_params), fields), fields
+
+
+def request_ids(request):
+    return parse_ids(request.query_params.get('ids'), config['API_MAX_PAGE_SIZE'])
+
+
+async def articles_page(session, request, query, descending=True):
+    cursor = request.query_params.get('cursor')
+    limit = page_limit(request, config['API_PAGE_SIZE'])
+    query, fields = articles_query(request, query)
+    query, before = keyset_query(query, cursor, limit, descending)
+    rows = (await session.scalars(query)).all()
+    return make_page(rows, cursor, limit, before), fields
+
+
+def page_json(page, fields):
+    return JSONResponse({'articles': [article_to_json(article, fields) for article in page.items],
+                         'next': page.next_cursor, 'prev': page.prev_cursor})
+
+
+async def json_stream(request, items):
+    if wants_ndjson(request):
+        chunks, media_type = async_ndjson(items), 'application/x-ndjson'
+    else:
+        chunks, media_type = async_json_array(items), 'application/json'
+    return StreamingResponse(async_buffered(chunks), media_type=media_type, headers={'Vary': 'Accept'})
+
+
+async def async_ndjson(items):
+    async for item in items:
+        yield json.dumps(item, ensure_ascii=False) + '\n'
+
+
+async def async_json_array(items):
+    yield '['
+    index = 0
+    async for item in items:
+        yield (',' if index else '') + json.dumps(item, ensure_ascii=False)
+        index += 1
+    yield ']'
+
+
+async def async_buffered(chunks, size=65536):
+    buffer, length = [], 0
+    async for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+# выгрузки держат свою сессию до конца потока
+async def stream_rows(query, serialize):
+    async with Session() as session:
+        result = await session.stream_scalars(
+            query.execution_options(yield_per=config['BULK_BATCH_SIZE']))
+        async for row in result:
+            yield serialize(row)
+
+
+async def get_articles(request):
+    ids = request_ids(request)
+    if ids:
+        query, fields = articles_query(request, select(Article))
+        async with Session() as session:
+            count, updated = await articles_state(session)
+            articles = in_requested_order((await session.scalars(query.where(Article.id.in_(ids)))).all(), ids)
+        return conditional(request, (count, updated, negotiated_type(request)), updated, lambda: JSONResponse(
+            {'articles': [article_to_json(article, fields) for article in articles], 'next': None, 'prev': None}),
+            vary='Accept')
+
+    # выгрузка проверяет валидаторы до начала потока, как во Flask
+    if wants_ndjson(request) or request.query_params.get('all'):
+        async with Session() as session:
+            count, updated = await articles_state(session)
+        query, fields = articles_query(request, select(Article))
+        query = query.order_by(Article.created_date.desc(), Article.id.desc())
+        stream = await json_stream(request, stream_rows(query, lambda article: article_to_json(article, fields)))
+        return conditional(request, (count, updated, negotiated_type(request)), updated, lambda: stream,
+                           vary='Accept')
+
+    async with Session() as session:
+        count, updated = await articles_state(session)
+        page, fields = await articles_page(session, request, select(Article))
+    return conditional(request, (count, updated, negotiated_type(request)), updated,
+                       lambda: page_json(page, fields), vary='Accept')
+
+
+async def get_articles_by_category(request):
+    category = request.path_params['category']
+    async with Session() as session:
+        count, updated = await articles_state(session, category)
+        page, fields = await articles_page(session, request,
+                                           select(Article).where(Article.category == category))
+
+    def build():
+        if not page.items and not request.query_params.get('cursor'):
+            return error(f'No articles found in category: {category}', 404)
+        return page_json(page, fields)
+    return conditional(request, (count, updated), updated, build)
+
+
+async def get_articles_sorted_by_date(request):
+    descending = request.query_params.get('order', 'desc') != 'asc'
+    async with Session() as session:
+        count, updated = await articles_state(session)
+        page, fields = await articles_page(session, request, select(Article), descending)
+    return conditional(request, (count, updated), updated, lambda: page_json(page, fields))
+
+
+async def get_article(request):
+    fields = parse_fields(request.query_params.get('fields'), ARTICLE_FIELDS)
+    # updated_at нужен для валидаторов, даже если его нет среди полей ответа
+    query = select_article_fields(select(Article), fields).options(undefer(Article.updated_at))
+    async with Session() as session:
+        article = (await session.scalars(query.where(Article.id == request.path_params['id']))).first()
+    if article is None:
+        return http_error(404)
+    return conditional(request, article.updated_at, article.updated_at,
+                       lambda: JSONResponse(article_to_json(article, fields)))
+
+
+async def get_article_comments(request):
+    article_id = request.path_params['id']
+    fields = parse_fields(request.query_params.get('fields'), COMMENT_FIELDS)
+    cursor = request.query_params.get('cursor')
+    limit = page_limit(request, config['COMMENTS_PER_PAGE'])
+    async with Session() as session:
+        if not await session.scalar(select(Article.id).where(Article.id == article_id)):
+            return error('Article not found', 404)
+        query, before = keyset_query(select_comment_fields(select(Comment), fields)
+                                     .where(Comment.article_id == article_id),
+                                     cursor, limit, descending=True,
+                                     sort_column=Comment.date, id_column=Comment.id)
+        rows = (await session.scalars(query)).all()
+    page = make_page(rows, cursor, limit, before, sort_column=Comment.date, id_column=Comment.id)
+    return JSONResponse({'comments': [comment_to_json(comment, fields) for comment in page.items],
+                         'next': page.next_cursor, 'prev': page.prev_cursor})
+
+
+async def get_comments(request):
+    fields = parse_fields(request.query_params.get('fields'), COMMENT_FIELDS)
+    query = select_comment_fields(filter_comments(select(Comment), request.query_params), fields)
+
+    ids = request_ids(request)
+    if ids:
+        async with Session() as session:
+            comments = in_requested_order((await session.scalars(query.where(Comment.id.in_(ids)))).all(), ids)
+        return await json_stream(request, async_iterate(comment_to_json(comment, fields) for comment in comments))
+
+    return await json_stream(request, stream_rows(query.order_by(*comment_order(request.query_params)),
+                                                  lambda comment: comment_to_json(comment, fields)))
+
+
+async def async_iterate(items):
+    for item in items:
+        yield item
+
+
+async def get_comment(request):
+    async with Session() as session:
+        comment = await session.get(Comment, request.path_params['id'])
+    if comment is None:
+        return http_error(404)
+    return JSONResponse(comment_to_json(comment))
+
+
+async def http_exception(request, exc):
+    if exc.status_code in default_exceptions:
+        return http_error(exc.status_code, exc.headers)
+    return Response(exc.detail, status_code=exc.status_code, headers=exc.headers)
+
+
+async def invalid_cursor(request, exc):
+    return error('Invalid cursor', 400)
+
+
+async def invalid_filter(request, exc):
+    return error(str(exc), 400)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/articles', get_articles),
+        Route('/api/articles/category/{category}', get_articles_by_category),
+        Route('/api/articles/sort/date', get_articles_sorted_by_date),
+        Route('/api/articles/{id:int}', get_article),
+        Route('/api/articles/{id:int}/comments', get_article_comments),
+        Route('/api/comment', get_comments),
+        Route('/api/comment/{id:int}', get_comment),
+    ],
+    exception_handlers={HTTPException: http_exception, InvalidCursor: invalid_cursor,
+                        InvalidFilter: invalid_filter},
+    lifespan=lifespan,
+)
@@ -0,0 +1,186 @@
+import gzip
+import hashlib
+import importlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+from io import BytesIO
+
+from flask import request, send_from_directory, url_for
+from flask.sessions import SecureCookieSessionInterface
+
+DIST = 'dist'
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html'}
+IMAGES = {'.jpg', '.jpeg', '.png'}
+
+logger = logging.getLogger('fefnews.assets')
+
+
+# Pillow и brotli нужны только сборке (flask build-assets), процесс,
+# который отдаёт уже собранные файлы, их не загружает
+def optional(name):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def fingerprint(path, data):
+    root, ext = os.path.splitext(path)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def write(root, path, data):
+    target = os.path.join(root, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(data)
+
+
+# сжатые копии кладутся рядом, только если они действительно меньше
+def precompress(root, path, data):
+    encodings = []
+    variants = [('gzip', '.gz', lambda raw: gzip.compress(raw, 9, mtime=0))]
+    brotli = optional('brotli')
+    if brotli is not None:
+        variants.insert(0, ('br', '.br', lambda raw: brotli.compress(raw, quality=11)))
+    for encoding, suffix, compress in variants:
+        compressed = compress(data)
+        if len(compressed) < len(data):
+            write(root, path + suffix, compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def encode_image(image, format, quality):
+    buffer = BytesIO()
+    if format == 'webp':
+        image.save(buffer, 'WEBP', quality=quality, method=6)
+    else:
+        image.convert('RGB').save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def image_variants(root, path, data, widths, quality):
+    Image = optional('PIL.Image')
+    original = Image.open(BytesIO(data))
+    original.load()
+    variants = {'jpeg': [], 'webp': []}
+    sizes = [width for width in widths if width < original.width] + [original.width]
+    for width in sizes:
+        height = round(original.height * width / original.width)
+        image = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+        base = os.path.splitext(path)[0]
+        for format, ext in (('jpeg', '.jpg'), ('webp', '.webp')):
+            encoded = encode_image(image, format, quality)
+            name = fingerprint(f'{DIST}/{base}.{width}w{ext}', encoded)
+            write(root, name, encoded)
+            variants[format].append((width, name))
+    return variants
+
+
+# Сборка static/: каждый файл копируется в static/dist под именем с хешем
+# содержимого, текстовые получают .br/.gz, картинки - уменьшенные копии
+# в JPEG и WebP. manifest.json связывает исходные имена с собранными.
+def build(static_folder, widths=(160, 320, 640, 960), quality=80, log=logger.info):
+    dist = os.path.join(static_folder, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {'files': {}, 'encodings': {}, 'images': {}}
+    has_brotli = optional('brotli') is not None
+    has_pillow = optional('PIL.Image') is not None
+
+    for directory, subdirs, files in os.walk(static_folder):
+        subdirs[:] = sorted(d for d in subdirs if os.path.join(directory, d) != dist)
+        for filename in sorted(files):
+            source = os.path.join(directory, filename)
+            path = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            name = fingerprint(f'{DIST}/{path}', data)
+            write(static_folder, name, data)
+            manifest['files'][path] = name
+            ext = os.path.splitext(path)[1].lower()
+            if ext in COMPRESSIBLE:
+                manifest['encodings'][name] = precompress(static_folder, name, data)
+            if ext in IMAGES and has_pillow:
+                manifest['images'][path] = image_variants(static_folder, path, data, widths, quality)
+            log(f'{path} -> {name}')
+
+    if not has_brotli:
+        log('brotli is not installed, only .gz variants were written')
+    if not has_pillow:
+        log('Pillow is not installed, image variants were skipped')
+    write(static_folder, f'{DIST}/manifest.json', json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+# Flask помечает сессию прочитанной при любом обращении к ней (а
+# flask_login смотрит в неё в after_request каждого запроса) и добавляет
+# Vary: Cookie. Собранные файлы от cookie не зависят, а с Vary: Cookie
+# общий кеш хранил бы копию файла на каждого посетителя.
+class SessionInterface(SecureCookieSessionInterface):
+    def __init__(self, cookieless):
+        self.cookieless = cookieless
+
+    def save_session(self, app, session, response):
+        if request.endpoint in self.cookieless and not session.modified:
+            return
+        super().save_session(app, session, response)
+
+
+# url_for('static', filename=...) отдаёт собранное имя, если static/dist
+# собран (flask build-assets), а /static/dist/ раздаётся с immutable:
+# имя меняется вместе с содержимым, поэтому браузер не перепроверяет файл.
+class Assets:
+    def __init__(self):
+        self.files = {}
+        self.encodings = {}
+        self.images = {}
+        self.max_age = 31536000
+        self.dist = None
+
+    def init_app(self, app):
+        self.max_age = app.config['ASSET_MAX_AGE']
+        self.dist = os.path.join(app.static_folder, DIST)
+        self.load()
+        app.url_defaults(self.url_defaults)
+        app.add_url_rule(f'{app.static_url_path}/{DIST}/<path:filename>', 'static_dist', self.serve)
+        app.session_interface = SessionInterface({'static_dist'})
+        app.add_template_global(self.srcset, 'asset_srcset')
+
+    def load(self):
+        try:
+            with open(os.path.join(self.dist, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+        self.files = manifest['files']
+        self.encodings = manifest['encodings']
+        self.images = manifest['images']
+
+    def url_defaults(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.files:
+            values['filename'] = self.files[values['filename']]
+
+    def srcset(self, filename, format='jpeg'):
+        variants = self.images.get(filename, {}).get(format, ())
+        return ', '.join(f"{url_for('static', filename=name)} {width}w" for width, name in variants)
+
+    def serve(self, filename):
+        name = f'{DIST}/{filename}'
+        mimetype = mimetypes.guess_type(filename)[0]
+        encoding = next((encoding for encoding in self.encodings.get(name, ())
+                         if encoding in request.accept_encodings), None)
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+        response = send_from_directory(self.dist, filename + suffix, mimetype=mimetype,
+                                       max_age=self.max_age)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if name in self.encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
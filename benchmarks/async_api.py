@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+from collections import Counter
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Одна и та же база отдаётся синхронным Flask (потоковый сервер werkzeug)
+# и асинхронным asgi.py под uvicorn. Пока открыто много "медленных"
+# соединений, которые так и не дослали запрос, активные клиенты опрашивают
+# API; сравниваются пропускная способность и хвосты задержек.
+SERVERS = {
+    'flask': [sys.executable, '-c',
+              'import sys; from werkzeug.serving import run_simple; from wsgi import app; '
+              'run_simple("127.0.0.1", int(sys.argv[1]), app, threaded=True)'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--log-level', 'warning',
+             '--backlog', '4096', '--port'],
+}
+PATHS = ['/api/articles?limit=20', '/api/articles/1', '/api/articles/1/comments', '/api/comment/1']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database():
+    db_path = os.path.join(tempfile.mkdtemp(), 'async_api.db')
+    subprocess.run([sys.executable, '-m', 'benchmarks.datagen', db_path, '--users', '50',
+                    '--articles-per-category', '100'], check=True, stdout=subprocess.DEVNULL)
+    return db_path
+
+
+async def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+async def request(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return int(data.split(b' ', 2)[1])
+
+
+async def hold_idle(port, count, stop):
+    connections = []
+    for _ in range(count):
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            break
+        # заголовки не дописаны: сервер ждёт продолжения, как от медленного клиента
+        writer.write(b'GET /api/articles HTTP/1.1\r\nHost: localhost\r\n')
+        connections.append(writer)
+    await stop.wait()
+    for writer in connections:
+        writer.close()
+    return len(connections)
+
+
+async def client(port, deadline, latencies, errors, index):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(request(port, PATHS[index % len(PATHS)]), 30)
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError) as e:
+            status = type(e).__name__
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(status)
+        index += 1
+
+
+async def drive(port, concurrency, idle, duration):
+    await wait_ready(port)
+    stop = asyncio.Event()
+    holder = asyncio.create_task(hold_idle(port, idle, stop))
+    await asyncio.sleep(1)
+
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(client(port, deadline, latencies, errors, i) for i in range(concurrency)))
+    stop.set()
+    held = await holder
+    return latencies, errors, held
+
+
+def run(name, db_path, concurrency, idle, duration):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', APP_ENV='production')
+    server = subprocess.Popen(SERVERS[name] + [str(port)], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        latencies, errors, held = asyncio.run(drive(port, concurrency, idle, duration))
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    if latencies:
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+        summary = (f'p50={statistics.median(latencies) * 1000:7.1f}ms p95={p95 * 1000:7.1f}ms '
+                   f'max={latencies[-1] * 1000:7.1f}ms')
+    else:
+        summary = 'no successful requests'
+    print(f'{name:6} idle={held:5} clients={concurrency:4} ok/s={len(latencies) / duration:7.1f} '
+          f'errors={len(errors):5} {summary}')
+    if errors:
+        print('       ' + ' '.join(f'{k}={v}' for k, v in Counter(map(str, errors)).most_common()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flask vs ASGI read API under many open connections')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--idle', type=int, default=1000, help='connections that never finish their request')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--server', choices=sorted(SERVERS), action='append')
+    args = parser.parse_args()
+
+    db_path = prepare_database()
+    try:
+        for name in args.server or ['flask', 'asgi']:
+            run(name, db_path, args.concurrency, args.idle, args.duration)
+    finally:
+        shutil.rmtree(os.path.dirname(db_path), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
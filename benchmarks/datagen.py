@@ -0,0 +1,143 @@
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+
+# Детерминированный генератор данных: при одинаковых параметрах и seed
+# получается одна и та же база, поэтому замеры на разных машинах и
+# между коммитами сравнимы. Строки пишутся пачками через insert() без
+# ORM-объектов; триггеры FTS и comment_count срабатывают как в проде.
+SYLLABLES = ['ка', 'ро', 'ми', 'то', 'на', 'ле', 'ви', 'за', 'по', 'ст', 'ра', 'не',
+             'го', 'ду', 'се', 'ти', 'ло', 'бе', 'ко', 'мо', 'ри', 'па', 'ше', 'ню']
+CATEGORIES = ['Технологии', 'Медицина', 'Общее', 'Наука', 'Спорт', 'Культура',
+              'Экономика', 'Политика', 'Образование', 'Путешествия', 'Авто', 'Игры']
+PASSWORD = 'benchmark'
+
+
+def make_vocabulary(rnd, size=5000):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))))
+    return sorted(words)
+
+
+# длины текстов распределены логнормально: много коротких, редкие длинные
+def text_length(rnd, median, sigma, maximum):
+    return max(1, min(maximum, int(rnd.lognormvariate(math.log(median), sigma))))
+
+
+def make_text(rnd, vocabulary, words):
+    return ' '.join(rnd.choices(vocabulary, k=words)).capitalize() + '.'
+
+
+def insert_rows(db, model, rows):
+    if rows:
+        db.session.execute(insert(model), rows)
+        db.session.commit()
+    return len(rows)
+
+
+def generate(db, User, Article, Comment, users=200, categories=6, articles_per_category=200,
+             comments_per_article=8, article_words=250, comment_words=25, days=365,
+             seed=1, batch_size=5000, log=print):
+    from werkzeug.security import generate_password_hash
+    from models import make_preview
+
+    rnd = random.Random(seed)
+    vocabulary = make_vocabulary(rnd)
+    hashed_password = generate_password_hash(PASSWORD)
+    now = datetime(2025, 1, 1)
+    started = time.perf_counter()
+
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    rows = [{'name': f'user{i}', 'email': f'user{i}@bench.local', 'hashed_password': hashed_password,
+             'created_date': now - timedelta(days=days)} for i in range(first_user, first_user + users)]
+    insert_rows(db, User, rows)
+    user_ids = list(range(first_user, first_user + users))
+    log(f'users: {users}')
+
+    first_article = (db.session.query(db.func.max(Article.id)).scalar() or 0) + 1
+    total, rows = 0, []
+    for category in CATEGORIES[:categories]:
+        for _ in range(articles_per_category):
+            text = make_text(rnd, vocabulary, text_length(rnd, article_words, 0.6, article_words * 20))
+            created = now - timedelta(seconds=rnd.randint(0, days * 86400))
+            rows.append({'title': make_text(rnd, vocabulary, rnd.randint(3, 9))[:-1],
+                         'text': text, 'preview': make_preview(text), 'category': category,
+                         'user_id': rnd.choice(user_ids), 'created_date': created,
+                         'updated_at': created})
+            if len(rows) >= batch_size:
+                total += insert_rows(db, Article, rows)
+                rows = []
+    total += insert_rows(db, Article, rows)
+    article_ids = range(first_article, first_article + total)
+    log(f'articles: {total}')
+
+    comments, rows = 0, []
+    for article_id in article_ids:
+        for _ in range(rnd.randint(0, comments_per_article * 2)):
+            date = now - timedelta(seconds=rnd.randint(0, days * 86400))
+            rows.append({'text': make_text(rnd, vocabulary, text_length(rnd, comment_words, 0.8, comment_words * 20)),
+                         'author_name': f'user{rnd.choice(user_ids)}', 'article_id': article_id,
+                         'date': date, 'updated_at': date})
+            if len(rows) >= batch_size:
+                comments += insert_rows(db, Comment, rows)
+                rows = []
+    comments += insert_rows(db, Comment, rows)
+    log(f'comments: {comments}')
+    log(f'generated in {time.perf_counter() - started:.1f}s')
+    return {'users': users, 'articles': total, 'comments': comments}
+
+
+def add_arguments(parser):
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--categories', type=int, default=6, choices=range(1, len(CATEGORIES) + 1),
+                        metavar=f'1..{len(CATEGORIES)}')
+    parser.add_argument('--articles-per-category', type=int, default=200)
+    parser.add_argument('--comments-per-article', type=int, default=8,
+                        help='mean; actual counts are uniform in 0..2*mean')
+    parser.add_argument('--article-words', type=int, default=250, help='median article length')
+    parser.add_argument('--comment-words', type=int, default=25, help='median comment length')
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def create_database(path, args):
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+
+    from app import create_app
+    from migrations import migrate
+    from models import db, User, Article, Comment
+
+    # пачки по несколько тысяч строк не должны попадать в лог медленных запросов
+    app = create_app(SLOW_QUERY_MS=10 ** 6)
+    with app.app_context():
+        db.create_all()
+        migrate(db.engine, log=lambda message: None)
+        return generate(db, User, Article, Comment, users=args.users, categories=args.categories,
+                        articles_per_category=args.articles_per_category,
+                        comments_per_article=args.comments_per_article,
+                        article_words=args.article_words, comment_words=args.comment_words,
+                        seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic SQLite database')
+    parser.add_argument('database', help='path of the SQLite file to create')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        print(f'{args.database} already exists', file=sys.stderr)
+        return 1
+    create_database(args.database, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from migrations import migrate
+from models import db
+
+
+CATEGORIES = ['Технологии', 'Медицина', 'Общее', 'Спорт', 'Наука', 'Культура']
+
+QUERIES = [
+    ('latest page',
+     'SELECT id, title, created_date FROM article '
+     'ORDER BY created_date DESC, id DESC LIMIT 11', ()),
+    ('deep keyset page',
+     'SELECT id, title, created_date FROM article WHERE (created_date, id) < (:date, :id) '
+     'ORDER BY created_date DESC, id DESC LIMIT 11', ('date', 'id')),
+    ('category page',
+     'SELECT id, title, created_date FROM article WHERE category = :category '
+     'ORDER BY created_date DESC, id DESC LIMIT 11', ('category',)),
+    ('distinct categories',
+     'SELECT DISTINCT category FROM article', ()),
+    ('articles by author',
+     'SELECT id FROM article WHERE user_id = :user_id', ('user_id',)),
+    ('comments of article',
+     'SELECT id, text, date FROM comment WHERE article_id = :article_id '
+     'ORDER BY date DESC', ('article_id',)),
+]
+
+
+def seed(path, users, articles, comments):
+    rnd = random.Random(42)
+    start = datetime(2020, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        'INSERT INTO user (id, name, email, hashed_password, created_date) VALUES (?, ?, ?, ?, ?)',
+        ((i, f'user{i}', f'user{i}@example.com', '-', start) for i in range(1, users + 1)))
+    conn.executemany(
+        'INSERT INTO article (id, title, text, created_date, user_id, category) VALUES (?, ?, ?, ?, ?, ?)',
+        ((i, f'title {i}', 'text ' * 40, start + timedelta(seconds=i * 60 + rnd.randint(0, 59)),
+          rnd.randint(1, users), rnd.choice(CATEGORIES)) for i in range(1, articles + 1)))
+    conn.executemany(
+        'INSERT INTO comment (text, date, article_id, author_name) VALUES (?, ?, ?, ?)',
+        (('comment', start + timedelta(seconds=i), rnd.randint(1, articles), 'reader')
+         for i in range(comments)))
+    conn.commit()
+    conn.close()
+
+
+def drop_indexes(path):
+    conn = sqlite3.connect(path)
+    for table in ('article', 'comment'):
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' "
+                                    "AND tbl_name = ? AND sql IS NOT NULL", (table,)).fetchall():
+            conn.execute(f'DROP INDEX {name}')
+    conn.execute('PRAGMA user_version = 0')
+    conn.commit()
+    conn.close()
+
+
+def sample_params(conn, articles):
+    article_id = articles // 2
+    date = conn.execute('SELECT created_date FROM article WHERE id = ?', (article_id,)).fetchone()[0]
+    return {'date': date, 'id': article_id, 'category': CATEGORIES[0],
+            'user_id': 1, 'article_id': article_id}
+
+
+def run_queries(path, params, repeat):
+    conn = sqlite3.connect(path)
+    results = {}
+    for name, sql, keys in QUERIES:
+        args = {key: params[key] for key in keys}
+        plan = ' | '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, args))
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(sql, args).fetchall()
+            timings.append(time.perf_counter() - started)
+        results[name] = (plan, statistics.median(timings) * 1000)
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query plans and timings before/after listing indexes')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--articles', type=int, default=200000)
+    parser.add_argument('--comments', type=int, default=500000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench_indexes.db')
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    drop_indexes(path)
+
+    print(f'Seeding {args.articles} articles and {args.comments} comments into {path}')
+    seed(path, args.users, args.articles, args.comments)
+
+    conn = sqlite3.connect(path)
+    params = sample_params(conn, args.articles)
+    conn.close()
+
+    before = run_queries(path, params, args.repeat)
+    migrate(engine, log=print)
+    after = run_queries(path, params, args.repeat)
+
+    for name, _, _ in QUERIES:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        print(f'\n{name}: {ms_before:.2f} ms -> {ms_after:.2f} ms')
+        print(f'  before: {plan_before}')
+        print(f'  after:  {plan_after}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+
+# Несколько процессов-воркеров работают с одним файлом базы, как воркеры
+# gunicorn, и смешивают чтения с записями комментариев. Один и тот же
+# прогон делается с настройками SQLite по умолчанию и с WAL/busy_timeout.
+PROFILES = {
+    'default': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL',
+                'SQLITE_BUSY_TIMEOUT': '0'},
+    'tuned': {'SQLITE_JOURNAL_MODE': 'WAL', 'SQLITE_SYNCHRONOUS': 'NORMAL',
+              'SQLITE_BUSY_TIMEOUT': '5000'},
+}
+
+
+def configure_environment(db_path, profile):
+    os.environ['APP_ENV'] = 'production'
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ.update(PROFILES[profile])
+
+
+def worker(db_path, profile, duration, write_ratio, seed, results):
+    configure_environment(db_path, profile)
+
+    from app import create_app
+    app = create_app()
+    app.logger.disabled = True
+    client = app.test_client()
+    rnd = random.Random(seed)
+
+    ok = errors = reads = writes = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        article_id = rnd.randint(1, 3)
+        if rnd.random() < write_ratio:
+            writes += 1
+            response = client.post('/api/comment', json={
+                'text': 'load test comment', 'author_name': 'load', 'article_id': article_id})
+        else:
+            reads += 1
+            response = client.get(rnd.choice([
+                f'/api/articles/{article_id}', '/api/articles?limit=20', f'/api/comment/{article_id}']))
+        if response.status_code < 500:
+            ok += 1
+        else:
+            errors += 1
+        response.close()
+    results.put((ok, errors, reads, writes))
+
+
+def prepare_database(profile):
+    db_path = os.path.join(tempfile.mkdtemp(), f'load_{profile}.db')
+    configure_environment(db_path, profile)
+    context = multiprocessing.get_context('spawn')
+    process = context.Process(target=init_database)
+    process.start()
+    process.join()
+    return db_path
+
+
+def init_database():
+    from app import create_app, init_db
+    create_app()
+    init_db()
+
+
+def run(profile, workers, duration, write_ratio):
+    db_path = prepare_database(profile)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=worker,
+                                 args=(db_path, profile, duration, write_ratio, i, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    totals = [0, 0, 0, 0]
+    for _ in processes:
+        for i, value in enumerate(results.get()):
+            totals[i] += value
+    for process in processes:
+        process.join()
+
+    ok, errors, reads, writes = totals
+    print(f'{profile:8} workers={workers} requests={ok + errors} '
+          f'ok/s={ok / duration:.0f} ok={ok} errors={errors} '
+          f'reads={reads} writes={writes}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mixed read/write load against one SQLite file')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append')
+    args = parser.parse_args()
+
+    for profile in args.profile or ['default', 'tuned']:
+        run(profile, args.workers, args.duration, args.write_ratio)
+
+
+if __name__ == '__main__':
+    main()
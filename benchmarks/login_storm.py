@@ -0,0 +1,122 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+# Сервер разработки с потоками запускается в отдельном процессе; пока
+# несколько клиентов непрерывно логинятся, замеряется задержка обычной
+# страницы. Сравниваются хеширование прямо в обработчике и пул процессов.
+PROFILES = {
+    'inline': {'PASSWORD_POOL_SIZE': '0'},
+    'pooled': {'PASSWORD_POOL_SIZE': '1'},
+}
+
+
+def serve(db_path, profile, ports):
+    os.environ['APP_ENV'] = 'production'
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    # лимиты попыток отключены, иначе шторм быстро упрётся в 429
+    os.environ['LOGIN_IP_LIMIT'] = '0'
+    os.environ['LOGIN_ACCOUNT_LIMIT'] = '0'
+    os.environ.update(PROFILES[profile])
+
+    from werkzeug.serving import make_server
+    from app import create_app, init_db, hasher
+    app = create_app()
+    app.logger.disabled = True
+    logging.getLogger('werkzeug').disabled = True
+    init_db()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    # обычный выход по SIGTERM, чтобы закрылся и пул хеширования
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    ports.put(server.server_port)
+    try:
+        server.serve_forever()
+    finally:
+        hasher.shutdown()
+
+
+def fetch(url, data=None):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, data=data, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - started
+
+
+def measure(url, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        latencies.append(fetch(url)[1])
+        time.sleep(0.02)
+    return latencies
+
+
+def storm(url, stop, statuses):
+    data = urllib.parse.urlencode({'email': 'bich@mail.ru', 'password': 'wrong-password'}).encode()
+    while not stop.is_set():
+        status, _ = fetch(url, data)
+        statuses[status] = statuses.get(status, 0) + 1
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f'  {label:12} n={len(latencies):4} p50={statistics.median(latencies) * 1000:7.1f}ms '
+          f'p95={p95 * 1000:7.1f}ms max={latencies[-1] * 1000:7.1f}ms')
+
+
+def run(profile, clients, duration):
+    db_path = os.path.join(tempfile.mkdtemp(), f'storm_{profile}.db')
+    context = multiprocessing.get_context('spawn')
+    ports = context.Queue()
+    server = context.Process(target=serve, args=(db_path, profile, ports))
+    server.start()
+    base = f'http://127.0.0.1:{ports.get(timeout=60)}'
+
+    try:
+        print(f'{profile} clients={clients}')
+        report('idle', measure(f'{base}/about', duration))
+
+        stop, statuses = threading.Event(), {}
+        threads = [threading.Thread(target=storm, args=(f'{base}/login', stop, statuses))
+                   for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        report('login storm', measure(f'{base}/about', duration))
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print('  login statuses ' + ' '.join(f'{k}={v}' for k, v in sorted(statuses.items())))
+    finally:
+        server.terminate()
+        server.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Page latency during a burst of logins')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append')
+    args = parser.parse_args()
+
+    for profile in args.profile or ['inline', 'pooled']:
+        run(profile, args.clients, args.duration)
+
+
+if __name__ == '__main__':
+    main()
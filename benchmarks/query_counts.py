@@ -0,0 +1,114 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+
+# Число SQL-запросов на эндпоинт не должно зависеть от размера выдачи:
+# каждый эндпоинт прогоняется с маленькой и большой страницей,
+# и если запросов стало больше - это N+1. Ещё один прогон идёт от имени
+# вошедшего пользователя: при тёплом кэше пользователей он не должен
+# давать лишний SELECT из user.
+SMALL_PAGE = 5
+LARGE_PAGE = 50
+
+ENDPOINTS = [
+    '/',
+    '/articles',
+    '/articles/cat0',
+    '/news/1',
+    '/api/articles',
+    '/api/articles/1',
+    '/api/articles/category/cat0',
+    '/api/articles/sort/date',
+    '/api/comment',
+]
+
+
+@contextmanager
+def count_queries(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def seed(db, User, Article, Comment, articles=LARGE_PAGE * 3, comments_per_article=3):
+    start = datetime(2024, 1, 1)
+    users = [User(name=f'user{i}', email=f'user{i}@example.com', hashed_password='-')
+             for i in range(articles)]
+    db.session.add_all(users)
+    db.session.flush()
+
+    for i, user in enumerate(users):
+        article = Article(title=f'title {i}', text='text ' * 50, category=f'cat{i % 2}',
+                          user_id=user.id, created_date=start + timedelta(minutes=i))
+        db.session.add(article)
+        db.session.flush()
+        for j in range(comments_per_article):
+            db.session.add(Comment(text=f'comment {j}', author_name=user.name,
+                                   article_id=article.id, date=article.created_date))
+    db.session.commit()
+
+
+def measure(app, engine, path, page_size, user_id=None):
+    from app import page_cache
+
+    page_cache.backend.clear()
+    app.config['ARTICLES_PER_PAGE'] = page_size
+    app.config['API_PAGE_SIZE'] = page_size
+    client = app.test_client()
+    if user_id is not None:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        client.get('/about')
+    with count_queries(engine) as statements:
+        response = client.get(path)
+    return response.status_code, len(statements)
+
+
+def main():
+    db_path = os.path.join(tempfile.mkdtemp(), 'query_counts.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app
+    from models import db, User, Article, Comment
+
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        seed(db, User, Article, Comment)
+        engine = db.engine
+
+    failed = False
+    print(f'{"endpoint":40} {"status":>6} {SMALL_PAGE:>6} {LARGE_PAGE:>6} {"auth":>6}')
+    for path in ENDPOINTS:
+        status, small = measure(app, engine, path, SMALL_PAGE)
+        _, large = measure(app, engine, path, LARGE_PAGE)
+        _, auth = measure(app, engine, path, SMALL_PAGE, user_id=1)
+        marker = ''
+        if large > small:
+            marker = '  <-- grows with result size'
+        elif auth > small:
+            marker = '  <-- extra queries for logged-in user'
+        failed = failed or bool(marker) or status != 200
+        print(f'{path:40} {status:>6} {small:>6} {large:>6} {auth:>6}{marker}')
+
+    from app import user_cache
+    print(f'user cache: {user_cache.stats()}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
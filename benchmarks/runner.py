@@ -0,0 +1,320 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmarks import datagen
+
+
+# Каждый сценарий - один маршрут. Прогон идёт последовательно через
+# test_client на копии сгенерированной базы, поэтому пишущие сценарии не
+# портят набор данных для следующего запуска. Результаты можно сохранить
+# как baseline и сравнивать с ним следующие прогоны.
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+class Context:
+    def __init__(self, app, rnd):
+        from models import db, User, Article, Comment
+
+        self.rnd = rnd
+        with app.app_context():
+            self.article_ids = [row[0] for row in db.session.query(Article.id)]
+            self.comment_ids = [row[0] for row in db.session.query(Comment.id)]
+            self.categories = [row[0] for row in db.session.query(Article.category).distinct()]
+            user = db.session.query(User).filter(User.email.like('%@bench.local')).first()
+            self.user_id, self.email = user.id, user.email
+            self.own_article_ids = [row[0] for row in db.session.query(Article.id).filter_by(user_id=user.id)]
+        self.created_articles = []
+        self.created_comments = []
+        self.registered = 0
+        self.words = ['ка', 'ро', 'мито', 'нале', 'кара', 'поро']
+
+    def article(self):
+        return self.rnd.choice(self.article_ids)
+
+    def comment(self):
+        return self.rnd.choice(self.comment_ids)
+
+    def own_article(self):
+        return self.rnd.choice(self.own_article_ids)
+
+    def new_email(self):
+        self.registered += 1
+        return f'runner{self.registered}-{self.rnd.randrange(10 ** 9)}@bench.local'
+
+    def category(self):
+        return self.rnd.choice(self.categories)
+
+    def query(self):
+        return self.rnd.choice(self.words)
+
+
+def article_payload(ctx):
+    return {'title': 'benchmark article', 'text': 'benchmark text ' * 40,
+            'category': ctx.category(), 'author_id': ctx.user_id}
+
+
+def comment_payload(ctx):
+    return {'text': 'benchmark comment', 'author_name': 'bench', 'article_id': ctx.article()}
+
+
+def remember(store, pattern, response):
+    match = re.search(pattern, response.location or '') if pattern else None
+    if match:
+        store.append(int(match.group(1)))
+    elif response.is_json and isinstance(response.get_json(), dict) and 'id' in response.get_json():
+        store.append(response.get_json()['id'])
+
+
+def pop_or(store, fallback):
+    return store.pop() if store else fallback()
+
+
+def ndjson(lines):
+    return ''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines)
+
+
+# (имя, метод, путь, аргументы запроса, клиент, доля итераций).
+# Клиент: anon и auth - общие на весь прогон (auth вошёл заранее), fresh -
+# новый без сессии на каждый запрос, fresh_auth - новый и уже вошедший.
+# Не прогоняются только потоки SSE (/events): они не завершаются сами.
+SCENARIOS = [
+    ('index', 'GET', lambda c: '/', None, 'anon', 1),
+    ('articles', 'GET', lambda c: '/articles', None, 'anon', 1),
+    ('articles_category', 'GET', lambda c: f'/articles/{c.category()}', None, 'anon', 1),
+    ('news', 'GET', lambda c: f'/news/{c.article()}', None, 'anon', 1),
+    ('about', 'GET', lambda c: '/about', None, 'anon', 1),
+    ('contact', 'GET', lambda c: '/contact', None, 'anon', 1),
+    ('feedback_form', 'GET', lambda c: '/feedback', None, 'anon', 1),
+    ('feedback_submit', 'POST', lambda c: '/feedback',
+     lambda c: {'data': {'username': 'bench', 'usermail': 'bench@bench.local', 'textmess': 'hello'}}, 'anon', 1),
+    ('search', 'GET', lambda c: f'/search?q={c.query()}', None, 'anon', 1),
+    ('login_form', 'GET', lambda c: '/login', None, 'anon', 1),
+    ('register_form', 'GET', lambda c: '/register', None, 'anon', 1),
+    ('login_submit', 'POST', lambda c: '/login',
+     lambda c: {'data': {'email': c.email, 'password': datagen.PASSWORD}}, 'fresh', 0.1),
+    ('register_submit', 'POST', lambda c: '/register',
+     lambda c: {'data': {'name': 'bench', 'email': c.new_email(), 'password': datagen.PASSWORD,
+                         'confirm_password': datagen.PASSWORD}}, 'fresh', 0.1),
+    ('logout', 'GET', lambda c: '/logout', None, 'fresh_auth', 0.1),
+    ('index_logged_in', 'GET', lambda c: '/', None, 'auth', 1),
+    ('create_article_form', 'GET', lambda c: '/create-article', None, 'auth', 1),
+    ('create_article', 'POST', lambda c: '/create-article',
+     lambda c: {'data': {'title': 'benchmark', 'text': 'benchmark text ' * 40, 'category': c.category()},
+                'remember': (c.created_articles, r'/news/(\d+)')}, 'auth', 1),
+    ('edit_article_form', 'GET', lambda c: f'/edit-article/{c.own_article()}', None, 'auth', 1),
+    ('edit_article', 'POST', lambda c: f'/edit-article/{c.own_article()}',
+     lambda c: {'data': {'title': 'edited', 'text': 'edited text ' * 40, 'category': c.category()}}, 'auth', 1),
+    ('add_comment', 'POST', lambda c: f'/add-comment/{c.article()}',
+     lambda c: {'data': {'comment_text': 'benchmark comment'}}, 'auth', 1),
+    ('delete_article', 'POST', lambda c: f'/delete-article/{pop_or(c.created_articles, c.own_article)}',
+     None, 'auth', 1),
+    ('api_articles', 'GET', lambda c: '/api/articles', None, 'anon', 1),
+    ('api_article', 'GET', lambda c: f'/api/articles/{c.article()}', None, 'anon', 1),
+    ('api_articles_category', 'GET', lambda c: f'/api/articles/category/{c.category()}', None, 'anon', 1),
+    ('api_articles_sorted', 'GET', lambda c: '/api/articles/sort/date', None, 'anon', 1),
+    ('api_article_comments', 'GET', lambda c: f'/api/articles/{c.article()}/comments', None, 'anon', 1),
+    ('api_comment', 'GET', lambda c: f'/api/comment/{c.comment()}', None, 'anon', 1),
+    ('api_create_article', 'POST', lambda c: '/api/articles',
+     lambda c: {'json': article_payload(c), 'remember': (c.created_articles, None)}, 'anon', 1),
+    ('api_update_article', 'PUT', lambda c: f'/api/articles/{c.article()}',
+     lambda c: {'json': article_payload(c)}, 'anon', 1),
+    ('api_delete_article', 'DELETE', lambda c: f'/api/articles/{pop_or(c.created_articles, c.article)}',
+     None, 'anon', 1),
+    ('api_create_comment', 'POST', lambda c: '/api/comment',
+     lambda c: {'json': comment_payload(c), 'remember': (c.created_comments, None)}, 'anon', 1),
+    ('api_update_comment', 'PUT', lambda c: f'/api/comment/{c.comment()}',
+     lambda c: {'json': comment_payload(c)}, 'anon', 1),
+    ('api_delete_comment', 'DELETE', lambda c: f'/api/comment/{pop_or(c.created_comments, c.comment)}',
+     None, 'anon', 1),
+    ('api_search', 'GET', lambda c: f'/api/search?q={c.query()}&scope=all', None, 'anon', 1),
+    ('api_articles_bulk', 'POST', lambda c: '/api/articles/bulk',
+     lambda c: {'data': ndjson(article_payload(c) for _ in range(50))}, 'anon', 0.1),
+    ('api_comments_bulk', 'POST', lambda c: '/api/comment/bulk',
+     lambda c: {'data': ndjson(comment_payload(c) for _ in range(50))}, 'anon', 0.1),
+    ('api_comments_all', 'GET', lambda c: '/api/comment', None, 'anon', 0.05),
+    ('api_articles_export', 'GET', lambda c: '/api/articles/export', None, 'anon', 0.05),
+    ('api_comments_export', 'GET', lambda c: '/api/comment/export', None, 'anon', 0.05),
+    ('api_trending', 'GET', lambda c: '/api/articles/trending', None, 'anon', 1),
+    ('api_most_discussed', 'GET', lambda c: '/api/articles/most-discussed', None, 'anon', 1),
+    ('api_user_cache_stats', 'GET', lambda c: '/api/stats/user-cache', None, 'anon', 1),
+    ('metrics', 'GET', lambda c: '/metrics', None, 'anon', 1),
+]
+
+
+def percentile(values, q):
+    return values[max(0, int(round(q / 100 * len(values))) - 1)]
+
+
+def copy_database(source):
+    target = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+        src.backup(dst)
+    return target
+
+
+def dataset_path(args):
+    params = {key: getattr(args, key) for key in
+              ('users', 'categories', 'articles_per_category', 'comments_per_article',
+               'article_words', 'comment_words', 'seed')}
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'fefnews-bench-{key}.db'), params
+
+
+def login(app, ctx):
+    client = app.test_client()
+    response = client.post('/login', data={'email': ctx.email, 'password': datagen.PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f'Benchmark login failed with {response.status_code}')
+    return client
+
+
+def scenario_client(app, ctx, clients, kind):
+    if kind == 'fresh':
+        return app.test_client()
+    if kind == 'fresh_auth':
+        return login(app, ctx)
+    return clients[kind]
+
+
+def run_scenario(app, ctx, clients, scenario, iterations, warmup):
+    name, method, path, options, kind, share = scenario
+    count = max(1, int(iterations * share))
+    latencies, statuses = [], {}
+
+    for i in range(warmup + count):
+        client = scenario_client(app, ctx, clients, kind)
+        kwargs = dict(options(ctx)) if options else {}
+        store = kwargs.pop('remember', None)
+        started = time.perf_counter()
+        response = client.open(path(ctx), method=method, **kwargs)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        if store:
+            remember(store[0], store[1], response)
+        response.close()
+        if i >= warmup:
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'n': count,
+        'p50': round(percentile(latencies, 50) * 1000, 3),
+        'p95': round(percentile(latencies, 95) * 1000, 3),
+        'p99': round(percentile(latencies, 99) * 1000, 3),
+        'rps': round(count / total, 1) if total else None,
+        'statuses': {str(status): n for status, n in sorted(statuses.items())}
+    }
+
+
+# коды ответов сравниваются по долям: при другом --iterations числа
+# разные, но смена 200 на 500 или новая доля 404 - всегда регрессия
+def status_shares(result):
+    return {status: round(n / result['n'], 2) for status, n in result['statuses'].items()}
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f'\n{"scenario":24} {"p95 base":>10} {"p95 now":>10} {"change":>8}')
+    for name, result in results.items():
+        old = baseline['results'].get(name)
+        if not old:
+            print(f'{name:24} {"-":>10} {result["p95"]:>10} {"new":>8}')
+            continue
+        change = (result['p95'] - old['p95']) / old['p95'] * 100 if old['p95'] else 0
+        marker = ''
+        if change > threshold:
+            marker = '  <-- regression'
+            regressions.append(name)
+        if status_shares(result) != status_shares(old):
+            marker += f'  <-- statuses {old["statuses"]} -> {result["statuses"]}'
+            if name not in regressions:
+                regressions.append(name)
+        print(f'{name:24} {old["p95"]:>10} {result["p95"]:>10} {change:>+7.1f}%{marker}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive the site routes through the test client')
+    datagen.add_arguments(parser)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', action='append', help='scenario name (repeatable)')
+    parser.add_argument('--save', metavar='NAME', help='store results as benchmarks/baselines/NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='diff against a stored baseline')
+    parser.add_argument('--threshold', type=float, default=20, help='allowed p95 growth, percent')
+    args = parser.parse_args()
+
+    source, params = dataset_path(args)
+    if not os.path.exists(source):
+        print(f'generating dataset {source}')
+        partial = source + '.partial'
+        if os.path.exists(partial):
+            os.remove(partial)
+        # приложение настраивается один раз на процесс, поэтому генерация
+        # идёт в отдельном процессе со своей DATABASE_URL
+        process = multiprocessing.get_context('spawn').Process(
+            target=datagen.create_database, args=(partial, args))
+        process.start()
+        process.join()
+        if process.exitcode:
+            return process.exitcode
+        shutil.move(partial, source)
+
+    os.environ.setdefault('APP_ENV', 'production')
+    os.environ['DATABASE_URL'] = f'sqlite:///{copy_database(source)}'
+    from app import create_app
+    from migrations import migrate
+    from models import db
+    app = create_app(PASSWORD_POOL_SIZE=0, LOGIN_IP_LIMIT=0, LOGIN_ACCOUNT_LIMIT=0,
+                     SERVER_TIMING=False, SLOW_QUERY_MS=10 ** 6)
+    app.logger.disabled = True
+    # набор данных кешируется между прогонами и мог быть создан до
+    # последних миграций
+    with app.app_context():
+        migrate(db.engine, log=None)
+
+    ctx = Context(app, random.Random(args.seed))
+    clients = {'anon': app.test_client(), 'auth': login(app, ctx)}
+
+    results = {}
+    print(f'{"scenario":24} {"n":>5} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>8}  statuses')
+    for scenario in SCENARIOS:
+        if args.only and scenario[0] not in args.only:
+            continue
+        result = run_scenario(app, ctx, clients, scenario, args.iterations, args.warmup)
+        results[scenario[0]] = result
+        statuses = ' '.join(f'{k}={v}' for k, v in result['statuses'].items())
+        print(f'{scenario[0]:24} {result["n"]:>5} {result["p50"]:>9} {result["p95"]:>9} '
+              f'{result["p99"]:>9} {result["rps"]:>8}  {statuses}')
+
+    report = {'dataset': params, 'iterations': args.iterations, 'results': results}
+    if args.save:
+        os.makedirs(BASELINES, exist_ok=True)
+        with open(os.path.join(BASELINES, f'{args.save}.json'), 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+
+    if args.compare:
+        with open(os.path.join(BASELINES, f'{args.compare}.json')) as f:
+            baseline = json.load(f)
+        if baseline['dataset'] != params:
+            print('warning: baseline was recorded on a different dataset', file=sys.stderr)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
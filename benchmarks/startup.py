@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+
+# Куда уходит время холодного старта воркера: каждый прогон - свежий
+# интерпретатор, в котором по очереди замеряются импорт app, create_app
+# и первые запросы (первый запрос к маршруту компилирует шаблоны, SQL
+# и конфигурирует мапперы, повторный показывает тёплое время). Профили
+# сравнивают старт без кеша шаблонов и с кешем после compile-templates.
+# Отдельно python -X importtime раскладывает импорт по пакетам.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+URLS = ['/', '/news/1', '/articles', '/api/articles']
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+app = module.create_app()
+created = time.perf_counter()
+client = app.test_client()
+phases = [('import app', imported - started), ('create_app', created - imported)]
+for attempt in ('first', 'repeat'):
+    for url in sys.argv[1:]:
+        before = time.perf_counter()
+        status = client.get(url).status_code
+        phases.append((f'{attempt} GET {url} [{status}]', time.perf_counter() - before))
+print(json.dumps(phases))
+'''
+
+
+def child_env(db_path, template_cache):
+    env = dict(os.environ, APP_ENV='production', DATABASE_URL=f'sqlite:///{db_path}',
+               TASKS_URL='memory://', TEMPLATE_CACHE_DIR=template_cache)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    return env
+
+
+def measure(env, urls):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD, *urls], env=env, cwd=ROOT,
+                            check=True, capture_output=True, text=True).stdout
+    total = time.perf_counter() - started
+    phases = json.loads(output.splitlines()[-1])
+    until_ready = sum(seconds for name, seconds in phases[:2])
+    return [('interpreter + exit', total - sum(seconds for name, seconds in phases))] + phases + \
+        [('ready to serve', until_ready)]
+
+
+def profile(name, env, urls, runs):
+    samples = defaultdict(list)
+    order = []
+    for _ in range(runs):
+        for phase, seconds in measure(env, urls):
+            if phase not in samples:
+                order.append(phase)
+            samples[phase].append(seconds)
+    print(f'\n{name} (median of {runs} runs)')
+    for phase in order:
+        print(f'  {phase:40} {statistics.median(samples[phase]) * 1000:8.1f} ms')
+
+
+# строки importtime: "import time: self | cumulative | имя" с отступом по
+# вложенности; self-время суммируется по пакету верхнего уровня
+def import_breakdown(env, top):
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], env=env, cwd=ROOT,
+                            check=True, capture_output=True, text=True).stderr
+    packages = defaultdict(int)
+    own = {}
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)', line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = int(match[1]), int(match[2]), match[3], match[4]
+        packages[module.split('.')[0]] += self_us
+        if os.path.exists(os.path.join(ROOT, module.split('.')[0] + '.py')):
+            own[module] = (self_us, cumulative_us)
+
+    total = sum(packages.values())
+    print(f'\nimport app: {total / 1000:.1f} ms, self time by top-level package')
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f'  {package:40} {self_us / 1000:8.1f} ms {self_us * 100 / total:5.1f}%')
+    print('\nproject modules (self / cumulative)')
+    for module, (self_us, cumulative_us) in sorted(own.items(), key=lambda item: -item[1][1])[:top]:
+        print(f'  {module:40} {self_us / 1000:8.1f} ms {cumulative_us / 1000:8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Where worker boot time goes')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--url', action='append', help='request to time after boot (repeatable)')
+    args = parser.parse_args()
+    urls = args.url or URLS
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'startup.db')
+    subprocess.run([sys.executable, '-m', 'benchmarks.datagen', db_path, '--users', '20',
+                    '--articles-per-category', '20'], check=True, cwd=ROOT, stdout=subprocess.DEVNULL)
+
+    template_cache = os.path.join(workdir, 'jinja_cache')
+    profile('without template cache', child_env(db_path, ''), urls, args.runs)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'wsgi', 'compile-templates'],
+                   env=child_env(db_path, template_cache), cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    profile('with compiled templates', child_env(db_path, template_cache), urls, args.runs)
+    import_breakdown(child_env(db_path, ''), args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+# Клиенты непрерывно открывают страницы статей, каждая из которых
+# засчитывает просмотр. Сравнивается запись счётчика прямо в запросе
+# (VIEW_BUFFER_INTERVAL=0) с буфером отложенной записи. После остановки
+# сервера по SIGTERM сумма просмотров в базе сверяется с числом ответов:
+# буфер должен сбросить остаток при выходе.
+PROFILES = {
+    'write-through': {'VIEW_BUFFER_INTERVAL': '0'},
+    'buffered': {'VIEW_BUFFER_INTERVAL': '1'},
+}
+
+
+def serve(db_path, profile, ports):
+    os.environ['APP_ENV'] = 'production'
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['TASKS_URL'] = 'memory://'
+    os.environ.update(PROFILES[profile])
+
+    from werkzeug.serving import make_server
+    from app import create_app
+    app = create_app()
+    app.logger.disabled = True
+    logging.getLogger('werkzeug').disabled = True
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    # обычный выход по SIGTERM, чтобы отработал atexit буфера
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+def client(base, article_ids, deadline, latencies, errors):
+    rnd = random.Random()
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(f'{base}/news/{rnd.choice(article_ids)}', timeout=30) as response:
+                response.read()
+            latencies.append(time.perf_counter() - started)
+        except (urllib.error.URLError, OSError):
+            errors.append(1)
+
+
+def total_views(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute('SELECT COALESCE(SUM(views), 0) FROM article_trend').fetchone()[0]
+
+
+def run(profile, source, clients, duration):
+    db_path = os.path.join(tempfile.mkdtemp(), f'views_{profile}.db')
+    with sqlite3.connect(source) as src, sqlite3.connect(db_path) as dst:
+        src.backup(dst)
+        article_ids = [row[0] for row in dst.execute('SELECT id FROM article ORDER BY id LIMIT 50')]
+
+    context = multiprocessing.get_context('spawn')
+    ports = context.Queue()
+    server = context.Process(target=serve, args=(db_path, profile, ports))
+    server.start()
+    base = f'http://127.0.0.1:{ports.get(timeout=60)}'
+
+    latencies, errors = [], []
+    try:
+        deadline = time.perf_counter() + duration
+        threads = [threading.Thread(target=client, args=(base, article_ids, deadline, latencies, errors))
+                   for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    stored = total_views(db_path)
+    print(f'{profile:14} clients={clients} req/s={len(latencies) / duration:7.1f} '
+          f'p50={statistics.median(latencies) * 1000:6.1f}ms p99={p99 * 1000:6.1f}ms '
+          f'errors={len(errors)} views={stored}/{len(latencies)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Article page latency with and without view write batching')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append')
+    args = parser.parse_args()
+
+    source = os.path.join(tempfile.mkdtemp(), 'views_source.db')
+    subprocess.run([sys.executable, '-m', 'benchmarks.datagen', source, '--users', '20',
+                    '--articles-per-category', '20'], check=True, stdout=subprocess.DEVNULL)
+    for profile in args.profile or ['write-through', 'buffered']:
+        run(profile, source, args.clients, args.duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import json
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import joinedload
+
+from models import db, User, Article, Comment, make_preview
+from serializers import (article_to_json, comment_to_json,
+                         validate_article_payload, validate_comment_payload)
+
+
+# Импорт и экспорт построчно (NDJSON): вход читается и вставляется пачками
+# по batch_size строк в отдельных транзакциях, внешние ключи каждой пачки
+# проверяются одним запросом IN, а результат по каждой строке отдаётся
+# сразу, не дожидаясь конца файла.
+def read_ndjson(lines):
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield number, None, {'json': f'Invalid JSON: {e}'}
+            continue
+        if not isinstance(data, dict):
+            yield number, None, {'json': 'Each line must be a JSON object'}
+        else:
+            yield number, data, None
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_date(data, field, errors):
+    value = data.get(field)
+    if value is None:
+        return datetime.now()
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        errors[field] = 'Date must be in ISO 8601 format'
+
+
+def existing_ids(column, ids):
+    ids = {value for value in ids if value is not None}
+    if not ids:
+        return set()
+    return set(db.session.scalars(select(column).where(column.in_(ids))))
+
+
+def insert_chunk(model, rows, results, pending):
+    if not rows:
+        return []
+    ids = db.session.scalars(
+        insert(model).returning(model.id, sort_by_parameter_order=True), rows).all()
+    db.session.commit()
+    for index, new_id in zip(pending, ids):
+        results[index]['id'] = new_id
+    return ids
+
+
+def import_articles(lines, batch_size=1000, on_commit=None):
+    for chunk in chunked(read_ndjson(lines), batch_size):
+        known_authors = existing_ids(
+            User.id, (to_int(data.get('author_id')) for _, data, _ in chunk if data))
+
+        rows, results, pending = [], [], []
+        for number, data, errors in chunk:
+            if errors is None:
+                errors = validate_article_payload(data)
+                author_id = to_int(data.get('author_id'))
+                if 'author_id' not in errors and author_id not in known_authors:
+                    errors['author_id'] = 'Author not found'
+                created_date = parse_date(data, 'created_date', errors)
+
+            if errors:
+                results.append({'line': number, 'status': 'error', 'errors': errors})
+                continue
+
+            text = data['text'].strip()
+            rows.append({
+                'title': data['title'].strip(),
+                'text': text,
+                'preview': make_preview(text),
+                'category': data['category'].strip(),
+                'user_id': author_id,
+                'created_date': created_date
+            })
+            pending.append(len(results))
+            results.append({'line': number, 'status': 'created'})
+
+        ids = insert_chunk(Article, rows, results, pending)
+        if ids and on_commit:
+            on_commit(ids)
+        yield from results
+
+
+def import_comments(lines, batch_size=1000, on_commit=None):
+    for chunk in chunked(read_ndjson(lines), batch_size):
+        known_articles = existing_ids(
+            Article.id, (to_int(data.get('article_id')) for _, data, _ in chunk if data))
+
+        rows, results, pending = [], [], []
+        for number, data, errors in chunk:
+            if errors is None:
+                errors = validate_comment_payload(data)
+                article_id = to_int(data.get('article_id'))
+                if 'article_id' not in errors and article_id not in known_articles:
+                    errors['article_id'] = 'Article not found'
+                date = parse_date(data, 'date', errors)
+
+            if errors:
+                results.append({'line': number, 'status': 'error', 'errors': errors})
+                continue
+
+            rows.append({
+                'text': data['text'].strip(),
+                'author_name': data['author_name'].strip(),
+                'article_id': article_id,
+                'date': date
+            })
+            pending.append(len(results))
+            results.append({'line': number, 'status': 'created'})
+
+        if insert_chunk(Comment, rows, results, pending) and on_commit:
+            on_commit({row['article_id'] for row in rows})
+        yield from results
+
+
+def with_summary(results):
+    created = failed = 0
+    for result in results:
+        if result['status'] == 'created':
+            created += 1
+        else:
+            failed += 1
+        yield result
+    yield {'summary': {'created': created, 'failed': failed}}
+
+
+def to_ndjson(items):
+    for item in items:
+        yield json.dumps(item, ensure_ascii=False) + '\n'
+
+
+def to_json_array(items):
+    yield '['
+    for index, item in enumerate(items):
+        yield (',' if index else '') + json.dumps(item, ensure_ascii=False)
+    yield ']'
+
+
+# отдаём серверу куски по ~64 КБ, а не по строке на каждую запись
+def buffered(chunks, size=65536):
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def export_articles(batch_size=1000, newest_first=False, query=None, serialize=article_to_json):
+    if newest_first:
+        order = (Article.created_date.desc(), Article.id.desc())
+    else:
+        order = (Article.id,)
+    if query is None:
+        query = select(Article).options(joinedload(Article.author))
+    query = query.order_by(*order).execution_options(yield_per=batch_size)
+    for article in db.session.scalars(query):
+        yield serialize(article)
+
+
+def export_comments(batch_size=1000, query=None, serialize=comment_to_json, order=(Comment.id,)):
+    if query is None:
+        query = select(Comment)
+    query = query.order_by(*order).execution_options(yield_per=batch_size)
+    for comment in db.session.scalars(query):
+        yield serialize(comment)
@@ -0,0 +1,142 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Общий для нескольких воркеров кэш в отдельном файле SQLite:
+# инвалидация в одном процессе сразу видна остальным.
+# Вытеснение по давности чтения (LRU): время доступа пишется при get, но
+# не чаще раза в touch_interval секунд на ключ, чтобы каждое чтение не
+# становилось записью в файл.
+class SQLiteBackend:
+    def __init__(self, path, max_entries=None, touch_interval=10):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._writes = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                         'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+                         'accessed REAL NOT NULL DEFAULT 0)')
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(cache)')]
+            if 'accessed' not in columns:
+                conn.execute('ALTER TABLE cache ADD COLUMN accessed REAL NOT NULL DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            self.delete(key)
+            return None
+        if self.max_entries is not None and now - accessed >= self.touch_interval:
+            conn.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires = now + ttl if ttl else None
+        self._connect().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+            (key, pickle.dumps(value), expires, now))
+        self._writes += 1
+        if self.max_entries is not None and self._writes % 100 == 0:
+            self.prune()
+
+    def prune(self):
+        conn = self._connect()
+        conn.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        conn.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                     'ORDER BY accessed DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache')
+
+
+def make_backend(url, max_entries=None):
+    if not url or url == 'memory://':
+        return MemoryBackend(max_entries)
+    if url.startswith('sqlite:///'):
+        path = url[len('sqlite:///'):]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return SQLiteBackend(path, max_entries)
+    raise ValueError(f'Unsupported cache backend: {url}')
+
+
+class Cache:
+    def __init__(self, url_key='CACHE_URL', size_key=None):
+        self.url_key = url_key
+        self.size_key = size_key
+        self.backend = None
+
+    def init_app(self, app):
+        max_entries = app.config[self.size_key] if self.size_key else None
+        self.backend = make_backend(app.config[self.url_key], max_entries)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl=ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
@@ -0,0 +1,52 @@
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import request, session, make_response
+
+
+# validator(**view_args) возвращает (состояние, время последнего изменения)
+# дешёвым агрегатным запросом. Если клиентская копия совпадает, ответ 304
+# отдаётся без рендеринга шаблона и сериализации JSON. Если формат ответа
+# выбирается по заголовку запроса, validator включает выбранный формат в
+# состояние, а заголовок передаётся в vary.
+def conditional(validator, vary=None):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            validated = validator(*args, **kwargs)
+            if validated is None:
+                return view(*args, **kwargs)
+
+            state, last_modified = validated
+            etag = hashlib.sha1(repr((request.full_path, state)).encode()).hexdigest()
+            if last_modified is not None:
+                last_modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+
+            if is_not_modified(etag, last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            if vary:
+                response.vary.add(vary)
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
@@ -0,0 +1,119 @@
+import os
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', '123456')
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///fefnews.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # пул соединений к файлу SQLite; для :memory: не применяется
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 10)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 20)
+    DB_POOL_TIMEOUT = env_int('DB_POOL_TIMEOUT', 30)
+
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = env_int('SQLITE_BUSY_TIMEOUT', 5000)
+
+    # снимки основной базы для чтения GET-запросами, через запятую,
+    # пути относительно instance; пусто - всё читается с основной базы
+    DB_REPLICAS = os.environ.get('DB_REPLICAS', '')
+    DB_REPLICA_REFRESH = env_int('DB_REPLICA_REFRESH', 5)
+    DB_REPLICA_MAX_LAG = env_int('DB_REPLICA_MAX_LAG', 60)
+
+    ARTICLES_PER_PAGE = env_int('ARTICLES_PER_PAGE', 10)
+    API_PAGE_SIZE = env_int('API_PAGE_SIZE', 20)
+    API_MAX_PAGE_SIZE = env_int('API_MAX_PAGE_SIZE', 100)
+    SEARCH_PER_PAGE = env_int('SEARCH_PER_PAGE', 10)
+    COMMENTS_PER_PAGE = env_int('COMMENTS_PER_PAGE', 20)
+    BULK_BATCH_SIZE = env_int('BULK_BATCH_SIZE', 1000)
+
+    CACHE_URL = os.environ.get('CACHE_URL', 'memory://')
+    CATEGORY_CACHE_TTL = env_int('CATEGORY_CACHE_TTL', 300)
+    PAGE_CACHE_URL = os.environ.get('PAGE_CACHE_URL', 'memory://')
+    PAGE_CACHE_SIZE = env_int('PAGE_CACHE_SIZE', 512)
+    PAGE_CACHE_TTL = env_int('PAGE_CACHE_TTL', 60)
+    USER_CACHE_URL = os.environ.get('USER_CACHE_URL', 'memory://')
+    USER_CACHE_SIZE = env_int('USER_CACHE_SIZE', 10000)
+    USER_CACHE_TTL = env_int('USER_CACHE_TTL', 300)
+
+    EVENTS_URL = os.environ.get('EVENTS_URL', 'memory://')
+    EVENTS_QUEUE_SIZE = env_int('EVENTS_QUEUE_SIZE', 100)
+    EVENTS_HISTORY = env_int('EVENTS_HISTORY', 100)
+    EVENTS_HEARTBEAT = env_int('EVENTS_HEARTBEAT', 15)
+    # открытый поток SSE занимает поток воркера целиком: лимит на процесс
+    # должен быть заметно меньше числа потоков воркера (gunicorn --threads),
+    # иначе читатели новостей займут все и обычные запросы встанут
+    EVENTS_MAX_STREAMS = env_int('EVENTS_MAX_STREAMS', 8)
+    EVENTS_BUSY_RETRY = env_int('EVENTS_BUSY_RETRY', 30)
+
+    TASKS_URL = os.environ.get('TASKS_URL', 'sqlite:///tasks.db')
+    TASKS_MAX_ATTEMPTS = env_int('TASKS_MAX_ATTEMPTS', 5)
+    TASKS_BACKOFF = env_int('TASKS_BACKOFF', 10)
+    TASKS_BACKOFF_MAX = env_int('TASKS_BACKOFF_MAX', 3600)
+    TASKS_LEASE = env_int('TASKS_LEASE', 300)
+    TASKS_POLL_INTERVAL = env_int('TASKS_POLL_INTERVAL', 1)
+    TASKS_RETENTION = env_int('TASKS_RETENTION', 86400)
+
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', '')
+    MAIL_PORT = env_int('MAIL_PORT', 587)
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', '1') == '1'
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_SENDER = os.environ.get('MAIL_SENDER', 'noreply@fefnews.local')
+    MAIL_TIMEOUT = env_int('MAIL_TIMEOUT', 30)
+    FEEDBACK_EMAIL = os.environ.get('FEEDBACK_EMAIL', 'feedback@fefnews.local')
+
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_SALT_LENGTH = env_int('PASSWORD_SALT_LENGTH', 16)
+    PASSWORD_POOL_SIZE = env_int('PASSWORD_POOL_SIZE', 2)
+    PASSWORD_POOL_QUEUE = env_int('PASSWORD_POOL_QUEUE', 8)
+    PASSWORD_POOL_NICE = env_int('PASSWORD_POOL_NICE', 10)
+    PASSWORD_HASH_TIMEOUT = env_int('PASSWORD_HASH_TIMEOUT', 10)
+
+    # число обратных прокси перед приложением: их X-Forwarded-For/Proto
+    # считаются доверенными, и лимит по IP видит адрес клиента, а не прокси.
+    # 0 - заголовкам не верим (приложение принимает запросы напрямую)
+    TRUSTED_PROXIES = env_int('TRUSTED_PROXIES', 0)
+
+    LOGIN_RATE_WINDOW = env_int('LOGIN_RATE_WINDOW', 300)
+    LOGIN_IP_LIMIT = env_int('LOGIN_IP_LIMIT', 30)
+    LOGIN_ACCOUNT_LIMIT = env_int('LOGIN_ACCOUNT_LIMIT', 5)
+
+    RANKING_WINDOW_HOURS = env_int('RANKING_WINDOW_HOURS', 168)
+    RANKING_COMPACT_INTERVAL = env_int('RANKING_COMPACT_INTERVAL', 600)
+    VIEW_BUFFER_INTERVAL = env_int('VIEW_BUFFER_INTERVAL', 5)
+    VIEW_BUFFER_SIZE = env_int('VIEW_BUFFER_SIZE', 1000)
+
+    # каталог в instance для байткода шаблонов; пусто - без кеша
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', 'jinja_cache')
+
+    ASSET_MAX_AGE = env_int('ASSET_MAX_AGE', 31536000)
+    ASSET_IMAGE_WIDTHS = (160, 320, 640, 960)
+    ASSET_IMAGE_QUALITY = env_int('ASSET_IMAGE_QUALITY', 80)
+
+    SLOW_QUERY_MS = env_int('SLOW_QUERY_MS', 100)
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    SERVER_TIMING = True
+
+
+class ProductionConfig(Config):
+    DEBUG = False
+
+
+configs = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+
+def get_config(name=None):
+    return configs[name or os.environ.get('APP_ENV', 'development')]
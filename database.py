@@ -0,0 +1,31 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def engine_options(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {}
+    if url.get_backend_name() == 'sqlite':
+        # ждём освобождения блокировки на уровне драйвера, а не падаем сразу
+        options['connect_args'] = {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}
+        if url.database and url.database != ':memory:':
+            options['pool_size'] = config['DB_POOL_SIZE']
+            options['max_overflow'] = config['DB_MAX_OVERFLOW']
+            options['pool_timeout'] = config['DB_POOL_TIMEOUT']
+    return options
+
+
+# WAL позволяет читателям не ждать писателя, busy_timeout - писателям
+# дожидаться друг друга вместо "database is locked", а synchronous=NORMAL
+# в режиме WAL не делает fsync на каждый коммит.
+def configure_sqlite(engine, config):
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}")
+        cursor.close()
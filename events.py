@@ -0,0 +1,216 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+
+
+class Subscription:
+    def __init__(self, broker, channels, size):
+        self.broker = broker
+        self.channels = channels
+        self.queue = queue.Queue(size)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout) if timeout else self.queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+# Подписчики в этом процессе: у каждого своя ограниченная очередь, чтобы
+# медленный клиент не копил события бесконечно (при переполнении он
+# получает 'reset' и перечитывает страницу), и короткая история на канал
+# для переподключения с Last-Event-ID.
+class MemoryBroker:
+    def __init__(self, queue_size=100, history=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._history = defaultdict(lambda: deque(maxlen=history))
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels, last_event_id=None):
+        subscription = Subscription(self, channels, self.queue_size)
+        with self._lock:
+            for channel in channels:
+                self._subscribers[channel].add(subscription)
+            if last_event_id is not None:
+                missed = sorted(event for channel in channels for event in self._history[channel]
+                                if event[0] > last_event_id)
+                for event in missed:
+                    self._put(subscription, event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def publish(self, channel, event_type, data):
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+        self.dispatch(event_id, channel, event_type, data)
+
+    def dispatch(self, event_id, channel, event_type, data):
+        event = (event_id, channel, event_type, data)
+        with self._lock:
+            self._last_id = max(self._last_id, event_id)
+            self._history[channel].append(event)
+            for subscription in self._subscribers.get(channel, ()):
+                self._put(subscription, event)
+
+    def _put(self, subscription, event):
+        try:
+            subscription.queue.put_nowait(event)
+        except queue.Full:
+            while not subscription.queue.empty():
+                subscription.get(0)
+            subscription.queue.put_nowait((event[0], event[1], 'reset', {}))
+
+
+# Замена брокера сообщений для нескольких воркеров без отдельного сервера:
+# события пишутся в общую таблицу SQLite, а поток в каждом процессе
+# забирает новые строки по id и раздаёт их своим подписчикам. Id строки
+# служит id события, поэтому Last-Event-ID работает через любой воркер.
+class SQLiteBroker(MemoryBroker):
+    def __init__(self, path, queue_size=100, history=100, poll_interval=0.2, retention=3600):
+        super().__init__(queue_size, history)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS event ('
+                     'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+                     'type TEXT NOT NULL, data TEXT NOT NULL, created REAL NOT NULL)')
+        self._cursor = conn.execute('SELECT COALESCE(MAX(id), 0) FROM event').fetchone()[0]
+        self._poller = None
+        self._poller_pid = None
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    # поток опроса запускается при первой подписке и заново после fork
+    def subscribe(self, channels, last_event_id=None):
+        if self._poller_pid != os.getpid():
+            self._poller_pid = os.getpid()
+            self._poller = threading.Thread(target=self._poll, daemon=True)
+            self._poller.start()
+        return super().subscribe(channels, last_event_id)
+
+    def publish(self, channel, event_type, data):
+        conn = self._connect()
+        conn.execute('INSERT INTO event (channel, type, data, created) VALUES (?, ?, ?, ?)',
+                     (channel, event_type, json.dumps(data, ensure_ascii=False), time.time()))
+
+    def _poll(self):
+        conn = self._connect()
+        last_prune = time.monotonic()
+        while True:
+            rows = conn.execute('SELECT id, channel, type, data FROM event WHERE id > ? ORDER BY id',
+                                (self._cursor,)).fetchall()
+            for event_id, channel, event_type, data in rows:
+                self.dispatch(event_id, channel, event_type, json.loads(data))
+                self._cursor = event_id
+            if time.monotonic() - last_prune > 60:
+                conn.execute('DELETE FROM event WHERE created < ?', (time.time() - self.retention,))
+                last_prune = time.monotonic()
+            time.sleep(self.poll_interval)
+
+
+def make_broker(url, queue_size=100, history=100, root=''):
+    if not url or url == 'memory://':
+        return MemoryBroker(queue_size, history)
+    if url.startswith('sqlite:///'):
+        path = os.path.join(root, url[len('sqlite:///'):])
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return SQLiteBroker(path, queue_size, history)
+    raise ValueError(f'Unsupported event broker: {url}')
+
+
+def format_event(event):
+    event_id, channel, event_type, data = event
+    payload = json.dumps(data, ensure_ascii=False)
+    return f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n'
+
+
+# Поток, который освобождает место в лимите при закрытии ответа -
+# werkzeug вызывает close(), даже если тело так и не начали читать.
+class EventStream:
+    def __init__(self, events, subscription):
+        self.events = events
+        self.subscription = subscription
+        self._iterator = events._iterate(subscription)
+        self._closed = False
+
+    def __iter__(self):
+        return self._iterator
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._iterator.close()
+            self.subscription.close()
+            self.events._release()
+
+
+class Events:
+    def __init__(self):
+        self.broker = None
+        self.heartbeat = 15
+        self.max_streams = 0
+        self.busy_retry = 30
+        self.streams = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.broker = make_broker(app.config['EVENTS_URL'], app.config['EVENTS_QUEUE_SIZE'],
+                                  app.config['EVENTS_HISTORY'], root=app.instance_path)
+        self.heartbeat = app.config['EVENTS_HEARTBEAT']
+        self.max_streams = app.config['EVENTS_MAX_STREAMS']
+        self.busy_retry = app.config['EVENTS_BUSY_RETRY']
+
+    def publish(self, channel, event_type, data):
+        self.broker.publish(channel, event_type, data)
+
+    # поток text/event-stream: события каналов и комментарий-пинг, если
+    # ничего не происходит, чтобы прокси не закрывали соединение. Подписка
+    # оформляется сразу, а не при первом чтении ответа, чтобы не потерять
+    # события, пока сервер начинает отдавать поток.
+    # Каждый поток держит поток (thread) WSGI-воркера, пока открыт, поэтому
+    # их не больше EVENTS_MAX_STREAMS на процесс. Сверх лимита клиент
+    # получает только retry: браузерный EventSource переподключится позже
+    # сам, а страница работает и без живых обновлений.
+    def stream(self, channels, last_event_id=None):
+        with self._lock:
+            if self.max_streams and self.streams >= self.max_streams:
+                return iter([f'retry: {self.busy_retry * 1000}\n\n'])
+            self.streams += 1
+        subscription = self.broker.subscribe(channels, last_event_id)
+        return EventStream(self, subscription)
+
+    def _release(self):
+        with self._lock:
+            self.streams -= 1
+
+    def _iterate(self, subscription):
+        yield 'retry: 3000\n\n'
+        while True:
+            event = subscription.get(self.heartbeat)
+            yield ': ping\n\n' if event is None else format_event(event)
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from models import Article, Comment
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+# Все фильтры превращаются в условия WHERE, которые покрываются индексами:
+# category/author_id + created_date (ix_article_category_created_date_id,
+# ix_article_user_id_created_date_id), article_id + date и date у комментариев.
+def parse_ids(raw, limit):
+    if not raw:
+        return None
+    try:
+        ids = [int(value) for value in raw.split(',') if value.strip()]
+    except ValueError:
+        raise InvalidFilter('ids must be a comma-separated list of integers')
+    if not ids:
+        return None
+    if len(ids) > limit:
+        raise InvalidFilter(f'At most {limit} ids per request')
+    return list(dict.fromkeys(ids))
+
+
+def parse_int(args, name):
+    raw = args.get(name)
+    if raw is None:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise InvalidFilter(f'{name} must be an integer')
+
+
+def parse_datetime(args, name):
+    raw = args.get(name)
+    if raw is None:
+        return None
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        raise InvalidFilter(f'{name} must be a date in ISO 8601 format')
+
+
+def parse_fields(raw, allowed):
+    if not raw:
+        return None
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise InvalidFilter(f'Unknown fields: {", ".join(unknown)}')
+    return list(dict.fromkeys(fields)) or None
+
+
+def in_date_range(query, column, args):
+    since = parse_datetime(args, 'since')
+    until = parse_datetime(args, 'until')
+    if since is not None:
+        query = query.filter(column >= since)
+    if until is not None:
+        query = query.filter(column < until)
+    return query
+
+
+def filter_articles(query, args):
+    author_id = parse_int(args, 'author_id')
+    if author_id is not None:
+        query = query.filter(Article.user_id == author_id)
+    if args.get('category'):
+        query = query.filter(Article.category == args['category'])
+    return in_date_range(query, Article.created_date, args)
+
+
+def filter_comments(query, args):
+    article_id = parse_int(args, 'article_id')
+    if article_id is not None:
+        query = query.filter(Comment.article_id == article_id)
+    return in_date_range(query, Comment.date, args)
+
+
+# выборка комментариев за период идёт по индексу (date, id) в его порядке,
+# иначе SQLite читает всю таблицу в порядке id
+def comment_order(args):
+    if args.get('since') is not None or args.get('until') is not None:
+        return Comment.date, Comment.id
+    return Comment.id,
+
+
+# строки из IN (...) возвращаются в том порядке, в котором их запросили
+def in_requested_order(rows, ids):
+    by_id = {row.id: row for row in rows}
+    return [by_id[row_id] for row_id in ids if row_id in by_id]
@@ -0,0 +1,50 @@
+import logging
+
+logger = logging.getLogger('fefnews.mail')
+
+
+# Письма отправляются только из фоновых задач (tasks.py), поэтому
+# медленный или недоступный SMTP-сервер не задерживает ответы. Без
+# MAIL_SERVER письмо пишется в лог - для разработки.
+class Mailer:
+    def __init__(self):
+        self.server = None
+        self.port = 587
+        self.use_tls = True
+        self.username = None
+        self.password = None
+        self.sender = None
+        self.timeout = 30
+
+    def init_app(self, app):
+        self.server = app.config['MAIL_SERVER']
+        self.port = app.config['MAIL_PORT']
+        self.use_tls = app.config['MAIL_USE_TLS']
+        self.username = app.config['MAIL_USERNAME']
+        self.password = app.config['MAIL_PASSWORD']
+        self.sender = app.config['MAIL_SENDER']
+        self.timeout = app.config['MAIL_TIMEOUT']
+
+    # smtplib нужен только воркеру задач, веб-процесс его не импортирует
+    def send(self, to, subject, body, reply_to=None):
+        import smtplib
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = to
+        message['Subject'] = subject
+        if reply_to:
+            message['Reply-To'] = reply_to
+        message.set_content(body)
+
+        if not self.server:
+            logger.warning('MAIL_SERVER is not set, message to %s not sent:\n%s', to, message)
+            return
+
+        with smtplib.SMTP(self.server, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
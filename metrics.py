@@ -0,0 +1,182 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+
+logger = logging.getLogger('fefnews.sql')
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+
+# Метрики собираются в памяти процесса: у каждого воркера свои счётчики,
+# Prometheus опрашивает /metrics каждого из них. На запрос заводится
+# состояние в g, в него события движка SQLAlchemy и сигналы шаблонов
+# складывают число запросов к базе и затраченное время.
+class Metrics:
+    def __init__(self):
+        self.slow_query_seconds = 0.1
+        self.server_timing = False
+        self.durations = defaultdict(Histogram)
+        self.requests = defaultdict(int)
+        self.db_queries = defaultdict(int)
+        self.db_seconds = defaultdict(float)
+        self.template_seconds = defaultdict(float)
+        self.slow_queries = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app, engine):
+        self.slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000
+        self.server_timing = app.config['SERVER_TIMING']
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        self.watch(engine)
+
+    def watch(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def _before_request(self):
+        g.metrics = {'start': time.perf_counter(), 'db_count': 0, 'db_time': 0.0,
+                     'template_time': 0.0, 'template_start': []}
+
+    def _before_render(self, sender, **extra):
+        state = g.get('metrics')
+        if state is not None:
+            state['template_start'].append(time.perf_counter())
+
+    # время вложенных шаблонов (include/extends) уже входит во внешний
+    # рендер, поэтому учитывается только самый внешний
+    def _after_render(self, sender, **extra):
+        state = g.get('metrics')
+        if state is not None and state['template_start']:
+            started = state['template_start'].pop()
+            if not state['template_start']:
+                state['template_time'] += time.perf_counter() - started
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        state = g.get('metrics') if has_request_context() else None
+        if state is not None:
+            state['db_count'] += 1
+            state['db_time'] += elapsed
+        if elapsed >= self.slow_query_seconds:
+            with self._lock:
+                self.slow_queries += 1
+            logger.warning('Slow query %.1f ms (%s): %s', elapsed * 1000,
+                           request.endpoint if has_request_context() else '-',
+                           ' '.join(statement.split())[:500])
+
+    # after_cursor_execute при ошибке не вызывается, отметка снимается здесь
+    def _handle_error(self, context):
+        conn = context.connection
+        if conn is not None and conn.info.get('query_start'):
+            conn.info['query_start'].pop()
+
+    def _after_request(self, response):
+        state = g.get('metrics')
+        if state is None:
+            return response
+        elapsed = time.perf_counter() - state['start']
+        key = (request.endpoint or 'unmatched', request.method, response.status_code)
+        # тело потоковых ответов (NDJSON, SSE) отдаётся уже после
+        # after_request, поэтому они учитываются при закрытии ответа
+        if response.is_streamed:
+            response.call_on_close(lambda: self._record(key, state))
+        else:
+            self._record(key, state)
+
+        if self.server_timing:
+            app_time = elapsed - state['db_time'] - state['template_time']
+            response.headers['Server-Timing'] = ', '.join([
+                f'db;dur={state["db_time"] * 1000:.2f};desc="{state["db_count"]} queries"',
+                f'tpl;dur={state["template_time"] * 1000:.2f}',
+                f'app;dur={app_time * 1000:.2f}',
+                f'total;dur={elapsed * 1000:.2f}'
+            ])
+        return response
+
+    def _record(self, key, state):
+        endpoint, method, status = key
+        elapsed = time.perf_counter() - state['start']
+        with self._lock:
+            self.durations[(endpoint, method)].observe(elapsed)
+            self.requests[(endpoint, method, status)] += 1
+            self.db_queries[endpoint] += state['db_count']
+            self.db_seconds[endpoint] += state['db_time']
+            self.template_seconds[endpoint] += state['template_time']
+
+    def render(self, extra=()):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{{{format_labels(labels)}}} {value}' if labels else f'{name} {value}')
+
+        def histograms(name, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, histogram in samples:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{format_labels(labels + [("le", bound)])}}} {cumulative}')
+                lines.append(f'{name}_bucket{{{format_labels(labels + [("le", "+Inf")])}}} {histogram.count}')
+            for labels, histogram in samples:
+                suffix = f'{{{format_labels(labels)}}}' if labels else ''
+                lines.append(f'{name}_sum{suffix} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{suffix} {histogram.count}')
+
+        with self._lock:
+            histograms('http_request_duration_seconds', 'Request latency by endpoint',
+                       [([('endpoint', e), ('method', m)], histogram)
+                        for (e, m), histogram in sorted(self.durations.items())])
+
+            metric('http_requests_total', 'counter', 'Requests by endpoint and status',
+                   [([('endpoint', e), ('method', m), ('status', s)], v)
+                    for (e, m, s), v in sorted(self.requests.items())])
+            metric('db_queries_total', 'counter', 'SQL statements executed while handling requests',
+                   [([('endpoint', e)], v) for e, v in sorted(self.db_queries.items())])
+            metric('db_seconds_total', 'counter', 'Time spent in SQL statements',
+                   [([('endpoint', e)], f'{v:.6f}') for e, v in sorted(self.db_seconds.items())])
+            metric('template_seconds_total', 'counter', 'Time spent rendering templates',
+                   [([('endpoint', e)], f'{v:.6f}') for e, v in sorted(self.template_seconds.items())])
+            metric('db_slow_queries_total', 'counter', 'SQL statements slower than SLOW_QUERY_MS',
+                   [([], self.slow_queries)])
+
+        for name, kind, help_text, value in extra:
+            if kind == 'histogram':
+                histograms(name, help_text, [([], value)])
+            else:
+                metric(name, kind, help_text, [([], value)])
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,223 @@
+import logging
+
+from sqlalchemy import text
+
+from models import PREVIEW_LENGTH
+
+logger = logging.getLogger('fefnews.migrations')
+
+
+# Версия схемы хранится в PRAGMA user_version. Миграции идемпотентны,
+# потому что на новой базе db.create_all() уже создаёт всё по models.py,
+# а на существующей (instance/fefnews.db) таблицы нужно догнать по месту.
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return decorator
+
+
+def get_version(conn):
+    return conn.execute(text('PRAGMA user_version')).scalar()
+
+
+def column_exists(conn, table, column):
+    rows = conn.execute(text(f'PRAGMA table_info({table})')).fetchall()
+    return any(row[1] == column for row in rows)
+
+
+def add_column(conn, table, column, ddl):
+    if not column_exists(conn, table, column):
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+
+def migrate(engine, log=logger.info):
+    applied = []
+    with engine.begin() as conn:
+        current = get_version(conn)
+        for version, description, func in MIGRATIONS:
+            if version <= current:
+                continue
+            func(conn)
+            conn.execute(text(f'PRAGMA user_version = {int(version)}'))
+            applied.append(version)
+            if log:
+                log(f'Applied migration {version}: {description}')
+    return applied
+
+
+@migration(1, 'indexes for article listings and comment threads')
+def add_listing_indexes(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_article_created_date_id '
+                      'ON article (created_date, id)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_article_category_created_date_id '
+                      'ON article (category, created_date, id)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_article_user_id ON article (user_id)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_comment_article_id_date '
+                      'ON comment (article_id, date)'))
+
+
+@migration(2, 'FTS5 full-text index over articles and comments')
+def add_search_index(conn):
+    conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS article_fts USING fts5("
+                      "title, text, content='article', content_rowid='id', "
+                      "tokenize='unicode61 remove_diacritics 2')"))
+    conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS comment_fts USING fts5("
+                      "text, content='comment', content_rowid='id', "
+                      "tokenize='unicode61 remove_diacritics 2')"))
+
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS article_fts_insert AFTER INSERT ON article BEGIN '
+                      'INSERT INTO article_fts (rowid, title, text) VALUES (new.id, new.title, new.text); '
+                      'END'))
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS article_fts_delete AFTER DELETE ON article BEGIN '
+                      "INSERT INTO article_fts (article_fts, rowid, title, text) "
+                      "VALUES ('delete', old.id, old.title, old.text); "
+                      'END'))
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS article_fts_update AFTER UPDATE OF title, text ON article BEGIN '
+                      "INSERT INTO article_fts (article_fts, rowid, title, text) "
+                      "VALUES ('delete', old.id, old.title, old.text); "
+                      'INSERT INTO article_fts (rowid, title, text) VALUES (new.id, new.title, new.text); '
+                      'END'))
+
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS comment_fts_insert AFTER INSERT ON comment BEGIN '
+                      'INSERT INTO comment_fts (rowid, text) VALUES (new.id, new.text); '
+                      'END'))
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS comment_fts_delete AFTER DELETE ON comment BEGIN '
+                      "INSERT INTO comment_fts (comment_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+                      'END'))
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS comment_fts_update AFTER UPDATE OF text ON comment BEGIN '
+                      "INSERT INTO comment_fts (comment_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+                      'INSERT INTO comment_fts (rowid, text) VALUES (new.id, new.text); '
+                      'END'))
+
+    conn.execute(text("INSERT INTO article_fts (article_fts) VALUES ('rebuild')"))
+    conn.execute(text("INSERT INTO comment_fts (comment_fts) VALUES ('rebuild')"))
+
+
+@migration(3, 'updated_at on articles and comments')
+def add_updated_at(conn):
+    add_column(conn, 'article', 'updated_at', 'DATETIME')
+    add_column(conn, 'comment', 'updated_at', 'DATETIME')
+    conn.execute(text('UPDATE article SET updated_at = created_date WHERE updated_at IS NULL'))
+    conn.execute(text('UPDATE comment SET updated_at = date WHERE updated_at IS NULL'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_article_updated_at ON article (updated_at)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_comment_article_id_updated_at '
+                      'ON comment (article_id, updated_at)'))
+
+
+# Счётчик комментариев ведут триггеры, чтобы он оставался верным при
+# любом способе записи: формы, REST API, массовый импорт и каскадное
+# удаление. Заодно сдвигается updated_at статьи - счётчик виден в списках.
+@migration(4, 'denormalized comment_count on articles')
+def add_comment_count(conn):
+    add_column(conn, 'article', 'comment_count', 'INTEGER NOT NULL DEFAULT 0')
+    conn.execute(text('UPDATE article SET comment_count = '
+                      '(SELECT count(*) FROM comment WHERE comment.article_id = article.id)'))
+
+    now = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS comment_count_insert AFTER INSERT ON comment BEGIN '
+                      f'UPDATE article SET comment_count = comment_count + 1, updated_at = {now} '
+                      'WHERE id = new.article_id; '
+                      'END'))
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS comment_count_delete AFTER DELETE ON comment BEGIN '
+                      f'UPDATE article SET comment_count = comment_count - 1, updated_at = {now} '
+                      'WHERE id = old.article_id; '
+                      'END'))
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS comment_count_move AFTER UPDATE OF article_id ON comment '
+                      'WHEN old.article_id != new.article_id BEGIN '
+                      f'UPDATE article SET comment_count = comment_count - 1, updated_at = {now} '
+                      'WHERE id = old.article_id; '
+                      f'UPDATE article SET comment_count = comment_count + 1, updated_at = {now} '
+                      'WHERE id = new.article_id; '
+                      'END'))
+
+
+@migration(5, 'stored article previews')
+def add_article_preview(conn):
+    add_column(conn, 'article', 'preview', 'VARCHAR(103)')
+
+
+# Фильтры API по автору и по дате: индекс (user_id, created_date, id)
+# отдаёт статьи автора уже в порядке страниц и заменяет индекс по user_id.
+@migration(6, 'indexes for API filters by author and date')
+def add_filter_indexes(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_article_user_id_created_date_id '
+                      'ON article (user_id, created_date, id)'))
+    conn.execute(text('DROP INDEX IF EXISTS ix_article_user_id'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_comment_date_id ON comment (date, id)'))
+
+
+# Комментарии попадают в почасовые счётчики рейтингов триггерами, как и
+# comment_count: так учитываются формы, REST API и массовый импорт.
+# Номер часа считается от строки даты так же, как rankings.bucket_of().
+@migration(7, 'hourly activity counters for article rankings')
+def add_article_rankings(conn):
+    conn.execute(text('CREATE TABLE IF NOT EXISTS article_activity ('
+                      'bucket INTEGER NOT NULL, article_id INTEGER NOT NULL, '
+                      'views INTEGER NOT NULL, comments INTEGER NOT NULL, '
+                      'PRIMARY KEY (bucket, article_id))'))
+    conn.execute(text('CREATE TABLE IF NOT EXISTS article_trend ('
+                      'article_id INTEGER NOT NULL PRIMARY KEY, category VARCHAR(50) NOT NULL, '
+                      'views INTEGER NOT NULL, comments INTEGER NOT NULL)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_article_trend_views ON article_trend (views)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_article_trend_comments ON article_trend (comments)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_article_trend_category_views '
+                      'ON article_trend (category, views)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_article_trend_category_comments '
+                      'ON article_trend (category, comments)'))
+
+    def added(row):
+        bucket = f"CAST(strftime('%s', COALESCE({row}.date, datetime('now', 'localtime'))) AS INTEGER) / 3600"
+        return (f'INSERT INTO article_activity (bucket, article_id, views, comments) '
+                f'VALUES ({bucket}, {row}.article_id, 0, 1) '
+                f'ON CONFLICT (bucket, article_id) DO UPDATE SET comments = comments + 1; '
+                f'INSERT INTO article_trend (article_id, category, views, comments) '
+                f'SELECT id, category, 0, 1 FROM article WHERE id = {row}.article_id '
+                f'ON CONFLICT (article_id) DO UPDATE SET comments = comments + 1; ')
+
+    # из суммы окна вычитается, только если час комментария ещё не вытеснен из окна
+    def removed(row):
+        bucket = f"CAST(strftime('%s', COALESCE({row}.date, datetime('now', 'localtime'))) AS INTEGER) / 3600"
+        return (f'UPDATE article_trend SET comments = comments - 1 WHERE article_id = {row}.article_id '
+                f'AND EXISTS (SELECT 1 FROM article_activity WHERE bucket = {bucket} '
+                f'AND article_id = {row}.article_id AND comments > 0); '
+                f'UPDATE article_activity SET comments = comments - 1 WHERE bucket = {bucket} '
+                f'AND article_id = {row}.article_id AND comments > 0; ')
+
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS comment_activity_insert AFTER INSERT ON comment '
+                      f'BEGIN {added("new")}END'))
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS comment_activity_delete AFTER DELETE ON comment '
+                      f'BEGIN {removed("old")}END'))
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS comment_activity_move AFTER UPDATE OF article_id ON comment '
+                      f'WHEN old.article_id != new.article_id BEGIN {removed("old")}{added("new")}END'))
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS article_trend_category AFTER UPDATE OF category ON article '
+                      'BEGIN UPDATE article_trend SET category = new.category WHERE article_id = new.id; END'))
+    conn.execute(text('CREATE TRIGGER IF NOT EXISTS article_activity_delete AFTER DELETE ON article BEGIN '
+                      'DELETE FROM article_activity WHERE article_id = old.id; '
+                      'DELETE FROM article_trend WHERE article_id = old.id; '
+                      'END'))
+
+
+# Миграция 5 только добавила колонку, и до flask backfill-previews у
+# старых строк preview = NULL: списки с отложенным text подгружали бы
+# text по запросу на строку. Заполняется здесь тем же правилом, что и
+# models.make_preview (length/substr в SQLite считают символы).
+@migration(8, 'backfill stored article previews')
+def backfill_article_previews(conn):
+    conn.execute(text("UPDATE article SET preview = CASE WHEN length(text) > :length "
+                      "THEN substr(text, 1, :length) || '...' ELSE text END WHERE preview IS NULL"),
+                 {'length': PREVIEW_LENGTH})
+
+
+# Время последнего сжатия рейтингов лежит в базе, а не в кеше процесса:
+# по нему главная страница видит новое сжатие в любом воркере, а процесс
+# сайта замечает, что воркер задач давно не сжимал счётчики.
+@migration(9, 'last ranking compaction time')
+def add_ranking_state(conn):
+    conn.execute(text('CREATE TABLE IF NOT EXISTS ranking_state ('
+                      'id INTEGER NOT NULL PRIMARY KEY, compacted FLOAT NOT NULL)'))
+    conn.execute(text('INSERT OR IGNORE INTO ranking_state (id, compacted) VALUES (1, 0)'))
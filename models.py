@@ -2,8 +2,18 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy.orm import validates
+
+from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+PREVIEW_LENGTH = 100
+
+
+def make_preview(text, length=PREVIEW_LENGTH):
+    return text[:length] + '...' if len(text) > length else text
 
-db = SQLAlchemy()
 
 class User(db.Model, UserMixin):
     __tablename__ = 'user'
@@ -13,7 +23,7 @@ class User(db.Model, UserMixin):
     hashed_password = db.Column(db.String(200), nullable=False)
     created_date = db.Column(db.DateTime, default=datetime.now)
 
-    articles = db.relationship('Article', backref='author', lazy=True)
+    articles = db.relationship('Article', back_populates='author', lazy=True)
 
     def set_password(self, password):
         self.hashed_password = generate_password_hash(password)
@@ -27,17 +37,73 @@ class Article(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     text = db.Column(db.Text, nullable=False)
+    preview = db.Column(db.String(PREVIEW_LENGTH + 3))
     created_date = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category = db.Column(db.String(50), nullable=False, default='general')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
+    __table_args__ = (
+        db.Index('ix_article_created_date_id', 'created_date', 'id'),
+        db.Index('ix_article_category_created_date_id', 'category', 'created_date', 'id'),
+        db.Index('ix_article_user_id_created_date_id', 'user_id', 'created_date', 'id'),
+        db.Index('ix_article_updated_at', 'updated_at'),
+    )
+
+    author = db.relationship('User', back_populates='articles')
     comments = db.relationship('Comment', backref='article', lazy=True, cascade='all, delete-orphan')
 
+    @validates('text')
+    def update_preview(self, key, text):
+        self.preview = make_preview(text)
+        return text
+
 class Comment(db.Model):
     __tablename__ = 'comment'
 
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.Text, nullable=False)
     date = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     article_id = db.Column(db.Integer, db.ForeignKey('article.id'), nullable=False)
-    author_name = db.Column(db.String(100), nullable=False)
\ No newline at end of file
+    author_name = db.Column(db.String(100), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_comment_article_id_date', 'article_id', 'date'),
+        db.Index('ix_comment_article_id_updated_at', 'article_id', 'updated_at'),
+        db.Index('ix_comment_date_id', 'date', 'id'),
+    )
+
+# Счётчики просмотров и комментариев по часам (bucket - номер часа от эпохи)
+# и суммы за скользящее окно по статье; см. rankings.py.
+class ArticleActivity(db.Model):
+    __tablename__ = 'article_activity'
+
+    bucket = db.Column(db.Integer, primary_key=True)
+    article_id = db.Column(db.Integer, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    comments = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ArticleTrend(db.Model):
+    __tablename__ = 'article_trend'
+
+    article_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    category = db.Column(db.String(50), nullable=False)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    comments = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_article_trend_views', 'views'),
+        db.Index('ix_article_trend_comments', 'comments'),
+        db.Index('ix_article_trend_category_views', 'category', 'views'),
+        db.Index('ix_article_trend_category_comments', 'category', 'comments'),
+    )
+
+
+class RankingState(db.Model):
+    __tablename__ = 'ranking_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    compacted = db.Column(db.Float, nullable=False, default=0)
@@ -0,0 +1,76 @@
+import hashlib
+import time
+import uuid
+from datetime import date
+from functools import wraps
+
+from flask import g, request, session, make_response, Response
+from flask_login import current_user
+
+from cache import Cache
+
+
+# Страницы не удаляются по ключам: каждая зависит от набора тегов
+# ('articles', 'news:<id>'), и версия тега входит в ключ. Запись в базу
+# меняет версию тега, и все зависящие от него страницы становятся
+# недостижимыми - в том числе в других воркерах с общим бэкендом.
+# Версия начинается со времени смены: страница, прочитанная со снимка
+# реплики (g.read_snapshot), снятого раньше, отдаётся, но не кешируется.
+class PageCache:
+    def __init__(self):
+        self.backend = Cache('PAGE_CACHE_URL', 'PAGE_CACHE_SIZE')
+        self.ttl = 60
+
+    def init_app(self, app):
+        self.backend.init_app(app)
+        self.ttl = app.config['PAGE_CACHE_TTL']
+
+    def generation(self, tag):
+        generation = self.backend.get(f'gen:{tag}')
+        if generation is None:
+            generation = self.invalidate(tag)
+        return generation
+
+    def invalidate(self, *tags):
+        generation = None
+        for tag in tags:
+            generation = f'{time.time():.6f}:{uuid.uuid4().hex}'
+            self.backend.set(f'gen:{tag}', generation)
+        return generation
+
+    def make_key(self, generations):
+        user = current_user.get_id() if current_user.is_authenticated else 'anon'
+        raw = repr((request.full_path, user, generations, date.today()))
+        return 'page:' + hashlib.sha1(raw.encode()).hexdigest()
+
+    def storable(self, generations):
+        snapshot = g.get('read_snapshot')
+        if snapshot is None:
+            return True
+        for generation in generations:
+            changed, sep, _ = generation.partition(':')
+            if not sep or float(changed) >= snapshot:
+                return False
+        return True
+
+    def cached(self, tags):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET' or session.get('_flashes'):
+                    return view(*args, **kwargs)
+
+                generations = [self.generation(tag) for tag in tags(*args, **kwargs)]
+                key = self.make_key(generations)
+                cached = self.backend.get(key)
+                if cached is not None:
+                    body, mimetype = cached
+                    return Response(body, mimetype=mimetype)
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough \
+                        and self.storable(generations):
+                    self.backend.set(key, (response.get_data(), response.mimetype), ttl=self.ttl)
+                return response
+            return wrapper
+        return decorator
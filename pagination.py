@@ -0,0 +1,92 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import Article
+
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# Курсор - это позиция (дата, id) последней/первой строки страницы,
+# поэтому страница на любой глубине выбирается одним индексным поиском
+# без OFFSET.
+def encode_cursor(sort_value, row_id, before=False):
+    payload = {'d': sort_value.isoformat(), 'i': row_id}
+    if before:
+        payload['b'] = 1
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        return datetime.fromisoformat(payload['d']), int(payload['i']), bool(payload.get('b'))
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def paginate(query, cursor=None, limit=10, descending=True,
+             sort_column=Article.created_date, id_column=Article.id):
+    query, before = keyset_query(query, cursor, limit, descending, sort_column, id_column)
+    return make_page(query.all(), cursor, limit, before, sort_column, id_column)
+
+
+# Разделено на построение запроса и сборку страницы, чтобы тот же код
+# работал и с Query, и с select() для асинхронной сессии (asgi.py).
+def keyset_query(query, cursor=None, limit=10, descending=True,
+                 sort_column=Article.created_date, id_column=Article.id):
+    before = False
+    if cursor:
+        sort_value, last_id, before = decode_cursor(cursor)
+
+    # для ссылки "назад" идём от курсора в обратную сторону и потом переворачиваем
+    scan_desc = descending != before
+
+    # сравнение кортежей SQLite превращает в поиск по диапазону индекса,
+    # а эквивалентное условие через OR - в сканирование с начала
+    if cursor:
+        position = tuple_(sort_column, id_column)
+        if scan_desc:
+            query = query.filter(position < tuple_(sort_value, last_id))
+        else:
+            query = query.filter(position > tuple_(sort_value, last_id))
+
+    if scan_desc:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    return query.limit(limit + 1), before
+
+
+def make_page(rows, cursor, limit, before, sort_column=Article.created_date, id_column=Article.id):
+    rows = list(rows)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+
+    if not rows:
+        return Page(rows, None, None)
+
+    def cursor_for(row, before=False):
+        return encode_cursor(getattr(row, sort_column.key), getattr(row, id_column.key), before)
+
+    if before:
+        next_cursor = cursor_for(rows[-1])
+        prev_cursor = cursor_for(rows[0], before=True) if has_more else None
+    else:
+        next_cursor = cursor_for(rows[-1]) if has_more else None
+        prev_cursor = cursor_for(rows[0], before=True) if cursor else None
+
+    return Page(rows, next_cursor, prev_cursor)
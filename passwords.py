@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def lower_priority(niceness):
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+
+
+# Хеширование паролей (scrypt/pbkdf2) занимает десятки-сотни мс CPU,
+# поэтому оно вынесено в ограниченный пул процессов с пониженным
+# приоритетом: всплеск логинов не отнимает процессор у остальных страниц,
+# а при переполненной очереди запрос сразу получает отказ.
+# PASSWORD_HASH_METHOD задаётся полностью (scrypt:N:r:p, pbkdf2:sha256:итерации),
+# с ним сравнивается префикс сохранённого хеша при перехешировании.
+class PasswordHasher:
+    def __init__(self):
+        self.method = 'scrypt:32768:8:1'
+        self.salt_length = 16
+        self.pool_size = 0
+        self.timeout = None
+        self.niceness = 0
+        self.queue_size = 0
+        self._slots = None
+        self._pool = None
+        self._pool_pid = None
+        self._dummy = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.salt_length = app.config['PASSWORD_SALT_LENGTH']
+        self.pool_size = app.config['PASSWORD_POOL_SIZE']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self.niceness = app.config['PASSWORD_POOL_NICE']
+        self.queue_size = app.config['PASSWORD_POOL_QUEUE']
+
+    def _get_pool(self):
+        # пул и слоты создаются лениво и заново после fork, иначе воркеры
+        # gunicorn унаследовали бы чужие процессы и занятые ими слоты
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.pool_size, initializer=lower_priority,
+                                                 initargs=(self.niceness,))
+                self._slots = threading.BoundedSemaphore(self.pool_size + self.queue_size)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def _run(self, func, *args):
+        if not self.pool_size:
+            return func(*args)
+        pool = self._get_pool()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = pool.submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # слот освобождается, когда задача действительно закончилась, а не
+        # по таймауту ожидания: иначе после таймаутов в пуле копились бы
+        # задачи сверх PASSWORD_POOL_SIZE + PASSWORD_POOL_QUEUE
+        future.add_done_callback(lambda future: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, hashed_password, password):
+        return self._run(check_password_hash, hashed_password, password)
+
+    # для несуществующего email проверяется фиктивный хеш, чтобы по времени
+    # ответа нельзя было узнать, зарегистрирован ли адрес
+    def verify_dummy(self, password):
+        if self._dummy is None:
+            self._dummy = self.hash('dummy-password')
+        self.verify(self._dummy, password)
+        return False
+
+    def needs_rehash(self, hashed_password):
+        return hashed_password.split('$', 1)[0] != self.method
+
+
+# Скользящее окно попыток в памяти процесса: с несколькими воркерами
+# лимит действует в каждом из них отдельно.
+class RateLimiter:
+    def __init__(self, limit_key, window_key='LOGIN_RATE_WINDOW'):
+        self.limit_key = limit_key
+        self.window_key = window_key
+        self.limit = None
+        self.window = 0
+        self._hits = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.limit = app.config[self.limit_key]
+        self.window = app.config[self.window_key]
+
+    def _prune(self, hits, now):
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    def is_limited(self, key):
+        if not self.limit:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return False
+            self._prune(hits, now)
+            if not hits:
+                del self._hits[key]
+                return False
+            return len(hits) >= self.limit
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._hits) > 10000:
+                self._sweep(now)
+            hits = self._hits[key]
+            self._prune(hits, now)
+            hits.append(now)
+
+    def _sweep(self, now):
+        for key in list(self._hits):
+            hits = self._hits[key]
+            self._prune(hits, now)
+            if not hits:
+                del self._hits[key]
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
@@ -0,0 +1,148 @@
+import calendar
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import make_response
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload, defer
+
+from models import db, Article, ArticleTrend
+from writebehind import CounterBuffer
+
+BUCKET_SECONDS = 3600
+KINDS = {'views': ArticleTrend.views, 'comments': ArticleTrend.comments}
+
+
+# даты в базе хранятся в локальном времени без зоны, и триггеры считают
+# час через strftime('%s', date), как будто это UTC - здесь то же самое
+def bucket_of(moment):
+    return calendar.timegm(moment.timetuple()) // BUCKET_SECONDS
+
+
+# Рейтинги "популярное за неделю" и "самое обсуждаемое" без полного
+# прохода по comment: события копятся в почасовых счётчиках
+# (article_activity), а в article_trend лежит сумма за окно по статье.
+# Топ-N - это чтение N первых строк индекса (views) или (category, views).
+# Сжатие вычитает из сумм часы, вышедшие из окна, и удаляет их, поэтому
+# обе таблицы ограничены числом статей с активностью за окно.
+class Rankings:
+    def __init__(self):
+        self.window = 168
+        self.compact_interval = 600
+        self.schedule = None
+        self.views = CounterBuffer('VIEW_BUFFER_INTERVAL', 'VIEW_BUFFER_SIZE')
+        self._last_scheduled = 0
+        self._compacted = 0
+        self._checked = 0
+
+    def init_app(self, app, schedule=None):
+        self.window = app.config['RANKING_WINDOW_HOURS']
+        self.compact_interval = app.config['RANKING_COMPACT_INTERVAL']
+        self.schedule = schedule
+        self.views.init_app(app, self.add_views)
+
+    def add_views(self, counts, moment=None):
+        if not counts:
+            return
+        bucket = bucket_of(moment or datetime.now())
+        rows = [{'bucket': bucket, 'article_id': article_id, 'views': views}
+                for article_id, views in counts.items()]
+        db.session.execute(text(
+            'INSERT INTO article_activity (bucket, article_id, views, comments) '
+            'SELECT :bucket, id, :views, 0 FROM article WHERE id = :article_id '
+            'ON CONFLICT (bucket, article_id) DO UPDATE SET views = views + excluded.views'), rows)
+        db.session.execute(text(
+            'INSERT INTO article_trend (article_id, category, views, comments) '
+            'SELECT id, category, :views, 0 FROM article WHERE id = :article_id '
+            'ON CONFLICT (article_id) DO UPDATE SET views = views + excluded.views'), rows)
+        db.session.commit()
+        self.maybe_compact()
+
+    # сжимает воркер задач; если воркера нет и последнее сжатие (его время
+    # общее для всех процессов) старше двух интервалов, сжимает сам процесс
+    # сайта - из потока буфера просмотров, а не из запроса
+    def maybe_compact(self):
+        if time.monotonic() - self._last_scheduled <= self.compact_interval:
+            return
+        self._last_scheduled = time.monotonic()
+        self._checked = 0
+        if self.schedule is None or time.time() - self.compacted_at() > self.compact_interval * 2:
+            self.compact()
+        else:
+            self.schedule()
+
+    # время последнего сжатия перечитывается из базы не чаще раза в секунду
+    def compacted_at(self):
+        now = time.monotonic()
+        if now - self._checked >= 1:
+            self._compacted = db.session.execute(
+                text('SELECT compacted FROM ranking_state WHERE id = 1')).scalar() or 0
+            self._checked = now
+        return self._compacted
+
+    def _mark_compacted(self):
+        db.session.execute(text(
+            'INSERT INTO ranking_state (id, compacted) VALUES (1, :now) '
+            'ON CONFLICT (id) DO UPDATE SET compacted = excluded.compacted'), {'now': time.time()})
+        self._checked = 0
+
+    def compact(self, moment=None):
+        cutoff = bucket_of(moment or datetime.now()) - self.window
+        db.session.execute(text(
+            'UPDATE article_trend SET views = article_trend.views - expired.views, '
+            'comments = article_trend.comments - expired.comments '
+            'FROM (SELECT article_id, sum(views) AS views, sum(comments) AS comments '
+            'FROM article_activity WHERE bucket <= :cutoff GROUP BY article_id) AS expired '
+            'WHERE article_trend.article_id = expired.article_id'), {'cutoff': cutoff})
+        removed = db.session.execute(text('DELETE FROM article_activity WHERE bucket <= :cutoff'),
+                                     {'cutoff': cutoff}).rowcount
+        db.session.execute(text('DELETE FROM article_trend WHERE views <= 0 AND comments <= 0'))
+        self._mark_compacted()
+        db.session.commit()
+        return removed
+
+    # пересчёт с нуля: комментарии за окно берутся из comment, просмотры -
+    # из уже накопленных счётчиков (другого источника у них нет)
+    def rebuild(self, moment=None):
+        cutoff = bucket_of(moment or datetime.now()) - self.window
+        bucket = "CAST(strftime('%s', date) AS INTEGER) / 3600"
+        db.session.execute(text('DELETE FROM article_activity WHERE bucket <= :cutoff OR views = 0'),
+                           {'cutoff': cutoff})
+        db.session.execute(text('UPDATE article_activity SET comments = 0'))
+        db.session.execute(text(
+            f'INSERT INTO article_activity (bucket, article_id, views, comments) '
+            f'SELECT {bucket} AS hour, article_id, 0, count(*) FROM comment '
+            f'WHERE date IS NOT NULL AND {bucket} > :cutoff GROUP BY hour, article_id '
+            f'ON CONFLICT (bucket, article_id) DO UPDATE SET comments = excluded.comments'),
+            {'cutoff': cutoff})
+        db.session.execute(text('DELETE FROM article_trend'))
+        db.session.execute(text(
+            'INSERT INTO article_trend (article_id, category, views, comments) '
+            'SELECT article.id, article.category, sum(activity.views), sum(activity.comments) '
+            'FROM article_activity AS activity JOIN article ON article.id = activity.article_id '
+            'GROUP BY article.id'))
+        self._mark_compacted()
+        db.session.commit()
+
+    def top(self, kind='views', category=None, limit=5):
+        score = KINDS[kind]
+        query = db.session.query(Article, score) \
+            .join(ArticleTrend, ArticleTrend.article_id == Article.id) \
+            .options(joinedload(Article.author), defer(Article.text)) \
+            .filter(score > 0)
+        if category:
+            query = query.filter(ArticleTrend.category == category)
+        return query.order_by(score.desc(), ArticleTrend.article_id.desc()).limit(limit).all()
+
+    # считает просмотр до кеша страниц и проверки ETag, иначе ответы из
+    # кеша и 304 не попали бы в счётчик; в базу просмотры уходят пачками
+    # через буфер, и запрос не ждёт блокировку записи SQLite
+    def counts_views(self, view):
+        @wraps(view)
+        def wrapper(id, *args, **kwargs):
+            response = make_response(view(id, *args, **kwargs))
+            if response.status_code in (200, 304):
+                self.views.add(id)
+            return response
+        return wrapper
@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from flask import g, request, session, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger('fefnews.replicas')
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+# Сессия отдаёт движок реплики, если его выбрал before_request. Запись
+# (flush, INSERT/UPDATE/DELETE через execute) и всё, что идёт после неё
+# в той же сессии, читает основную базу.
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not self.info.get('wrote') \
+                and not getattr(clause, 'is_dml', False) and has_app_context():
+            engine = g.get('read_engine')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def mark_flush(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def mark_dml(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info['wrote'] = True
+
+
+def read_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA query_only=ON')
+    cursor.close()
+
+
+# Реплика - копия файла основной базы, снятая online backup API. Копия
+# пишется во временный файл и подменяет реплику через rename, поэтому
+# читатели не ждут обновления: открытое соединение дочитывает старый
+# снимок, новое (пула нет, NullPool) открывает уже свежий. Время начала
+# снимка лежит рядом в .snapshot и общее для всех процессов.
+class Replica:
+    def __init__(self, path, timeout):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.engine = create_engine(f'sqlite:///{path}', poolclass=NullPool,
+                                    connect_args={'timeout': timeout})
+        event.listen(self.engine, 'connect', read_only)
+        self.snapshot_at = 0
+        self._checked = 0
+
+    def fresh_as_of(self, now):
+        if now - self._checked >= 1:
+            self._checked = now
+            try:
+                with open(self.path + '.snapshot') as f:
+                    self.snapshot_at = json.load(f)['snapshot_at']
+            except (OSError, ValueError, KeyError):
+                self.snapshot_at = 0
+        return self.snapshot_at
+
+    # fcntl есть только на POSIX: импорт здесь, чтобы модуль (и app)
+    # импортировался везде, а обновление реплик требовало POSIX
+    def refresh(self, primary_path, interval, timeout):
+        import fcntl
+
+        with open(self.path + '.lock', 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            self._checked = 0
+            if time.time() - self.fresh_as_of(time.time()) < interval * 0.9:
+                return False
+
+            tmp = self.path + '.tmp'
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            started = time.time()
+            source = sqlite3.connect(primary_path, timeout=timeout)
+            target = sqlite3.connect(tmp)
+            try:
+                source.backup(target)
+                # без WAL: у реплики не должно быть -wal/-shm от прошлого файла
+                target.execute('PRAGMA journal_mode=DELETE')
+            finally:
+                target.close()
+                source.close()
+            os.replace(tmp, self.path)
+
+            with open(self.path + '.snapshot.tmp', 'w') as f:
+                json.dump({'snapshot_at': started, 'seconds': time.time() - started}, f)
+            os.replace(self.path + '.snapshot.tmp', self.path + '.snapshot')
+            self.snapshot_at = started
+            self._checked = time.time()
+            return True
+
+
+# GET и HEAD читают с реплики, остальное - с основной базы. После своей
+# записи пользователь получает в сессии отметку last_write и читает с
+# основной базы, пока не появится реплика со снимком, начатым позже этой
+# отметки - так редирект после комментария показывает сам комментарий.
+# Реплика старше DB_REPLICA_MAX_LAG не используется никем.
+class Replicas:
+    def __init__(self):
+        self.replicas = []
+        self.db = None
+        self.primary_path = None
+        self.refresh_interval = 5
+        self.max_lag = 60
+        self.timeout = 5
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._lock = threading.Lock()
+        self._thread_pid = None
+
+    def init_app(self, app, db):
+        self.db = db
+        self.refresh_interval = app.config['DB_REPLICA_REFRESH']
+        self.max_lag = app.config['DB_REPLICA_MAX_LAG']
+        self.timeout = app.config['SQLITE_BUSY_TIMEOUT'] / 1000
+        paths = [path.strip() for path in app.config['DB_REPLICAS'].split(',') if path.strip()]
+        if not paths:
+            return
+
+        url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+            raise ValueError('DB_REPLICAS requires a file-based SQLite primary database')
+        with app.app_context():
+            self.primary_path = db.engine.url.database
+        self.replicas = [Replica(os.path.join(app.instance_path, path), self.timeout) for path in paths]
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    @property
+    def engines(self):
+        return [replica.engine for replica in self.replicas]
+
+    def _before_request(self):
+        if self.refresh_interval:
+            self._ensure_thread()
+        if request.method not in READ_METHODS:
+            return
+        now = time.time()
+        last_write = session.get('last_write', 0)
+        candidates = [replica for replica in self.replicas
+                      if last_write < replica.fresh_as_of(now) and now - replica.snapshot_at <= self.max_lag]
+        with self._lock:
+            if candidates:
+                self.replica_reads += 1
+            else:
+                self.primary_reads += 1
+        if candidates:
+            replica = random.choice(candidates)
+            g.read_engine = replica.engine
+            g.read_snapshot = replica.snapshot_at
+
+    def _after_request(self, response):
+        if self.db.session.info.get('wrote'):
+            session['last_write'] = time.time()
+        return response
+
+    def refresh(self, force=False):
+        interval = 0 if force else self.refresh_interval
+        refreshed = 0
+        for replica in self.replicas:
+            try:
+                if replica.refresh(self.primary_path, interval, self.timeout):
+                    refreshed += 1
+            except (OSError, sqlite3.Error):
+                logger.exception('Snapshot of %s failed', replica.path)
+                with self._lock:
+                    self.refresh_errors += 1
+        with self._lock:
+            self.refreshes += refreshed
+        return refreshed
+
+    # обновляет снимки поток в каждом процессе, но копирует только тот,
+    # кто взял flock и увидел, что снимок старше интервала
+    def _ensure_thread(self):
+        if self._thread_pid != os.getpid():
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            time.sleep(self.refresh_interval)
+
+    def stats(self):
+        now = time.time()
+        lags = [now - replica.fresh_as_of(now) for replica in self.replicas]
+        with self._lock:
+            return {
+                'replicas': len(self.replicas),
+                'lag_seconds': max(lags) if lags else 0,
+                'replica_reads': self.replica_reads,
+                'primary_reads': self.primary_reads,
+                'refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors,
+            }
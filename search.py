@@ -0,0 +1,101 @@
+import re
+from datetime import datetime
+
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+from models import db
+
+
+# FTS5 возвращает подсветку с этими маркерами, а в HTML они
+# превращаются в <mark> уже после экранирования текста.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+SCOPES = ('articles', 'comments', 'all')
+
+ARTICLE_SQL = (
+    "SELECT 'article' AS type, a.id AS id, a.id AS article_id, a.title AS title, "
+    "a.category AS category, a.created_date AS date, u.name AS author, "
+    "highlight(article_fts, 0, :start, :end) AS title_html, "
+    "snippet(article_fts, 1, :start, :end, '…', 24) AS snippet_html, "
+    "bm25(article_fts, 10.0, 1.0) AS rank "
+    "FROM article_fts "
+    "JOIN article a ON a.id = article_fts.rowid "
+    'JOIN "user" u ON u.id = a.user_id '
+    "WHERE article_fts MATCH :query"
+)
+
+COMMENT_SQL = (
+    "SELECT 'comment' AS type, c.id AS id, c.article_id AS article_id, a.title AS title, "
+    "a.category AS category, c.date AS date, c.author_name AS author, "
+    "a.title AS title_html, "
+    "snippet(comment_fts, 0, :start, :end, '…', 24) AS snippet_html, "
+    "bm25(comment_fts) AS rank "
+    "FROM comment_fts "
+    "JOIN comment c ON c.id = comment_fts.rowid "
+    "JOIN article a ON a.id = c.article_id "
+    "WHERE comment_fts MATCH :query"
+)
+
+
+def build_match_query(raw):
+    # пользовательский ввод не должен попадать в синтаксис MATCH как есть:
+    # каждое слово берётся в кавычки, последнее ищется по префиксу
+    words = re.findall(r'\w+', raw or '')
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def to_html(value):
+    return Markup(str(escape(value))
+                  .replace(MARK_START, '<mark>')
+                  .replace(MARK_END, '</mark>'))
+
+
+def search(raw_query, scope='articles', page=1, per_page=10):
+    match = build_match_query(raw_query)
+    if match is None:
+        return [], False
+
+    if scope == 'comments':
+        sql = COMMENT_SQL
+    elif scope == 'all':
+        sql = f'{ARTICLE_SQL} UNION ALL {COMMENT_SQL}'
+    else:
+        sql = ARTICLE_SQL
+
+    rows = db.session.execute(
+        text(f'{sql} ORDER BY rank LIMIT :limit OFFSET :offset'),
+        {'query': match, 'start': MARK_START, 'end': MARK_END,
+         'limit': per_page + 1, 'offset': (page - 1) * per_page}
+    ).mappings().all()
+
+    has_more = len(rows) > per_page
+    results = []
+    for row in rows[:per_page]:
+        result = dict(row)
+        if isinstance(result['date'], str):
+            result['date'] = datetime.fromisoformat(result['date'])
+        result['title_html'] = to_html(result['title_html'])
+        result['snippet_html'] = to_html(result['snippet_html'])
+        results.append(result)
+    return results, has_more
+
+
+def result_to_json(result):
+    return {
+        'type': result['type'],
+        'id': result['id'],
+        'article_id': result['article_id'],
+        'title': result['title'],
+        'category': result['category'],
+        'author': result['author'],
+        'date': result['date'].isoformat() if result['date'] else None,
+        'title_html': str(result['title_html']),
+        'snippet_html': str(result['snippet_html']),
+        'rank': result['rank']
+    }
@@ -0,0 +1,136 @@
+from sqlalchemy.orm import joinedload, defer, load_only
+
+from models import User, Article, Comment, make_preview
+
+
+# Автор подгружается JOIN-ом в том же запросе, что и статьи,
+# иначе article.author.name даёт отдельный SELECT на каждую статью.
+def with_author(query):
+    return query.options(joinedload(Article.author))
+
+
+# Спискам нужен только анонс, поэтому полный текст статьи в них не грузится.
+def without_text(query):
+    return query.options(defer(Article.text))
+
+
+def article_to_view(article, with_content=True):
+    view = {
+        'id': article.id,
+        'title': article.title,
+        'date': article.created_date,
+        'preview': article.preview if article.preview is not None else make_preview(article.text),
+        'author': article.author.name,
+        'category': article.category,
+        'comment_count': article.comment_count
+    }
+    if with_content:
+        view['content'] = article.text
+    return view
+
+
+# Поля для ?fields=: колонка, которую нужно выбрать, и значение в ответе.
+# id и дата выбираются всегда - по ним строятся курсоры страниц.
+ARTICLE_FIELDS = {
+    'id': (Article.id, lambda article: article.id),
+    'title': (Article.title, lambda article: article.title),
+    'text': (Article.text, lambda article: article.text),
+    'preview': (Article.preview, lambda article: article.preview),
+    'category': (Article.category, lambda article: article.category),
+    'author': (Article.user_id, lambda article: article.author.name),
+    'author_id': (Article.user_id, lambda article: article.user_id),
+    'comment_count': (Article.comment_count, lambda article: article.comment_count),
+    'created_date': (Article.created_date, lambda article: article.created_date.isoformat()),
+}
+
+COMMENT_FIELDS = {
+    'id': (Comment.id, lambda comment: comment.id),
+    'text': (Comment.text, lambda comment: comment.text),
+    'author_name': (Comment.author_name, lambda comment: comment.author_name),
+    'article_id': (Comment.article_id, lambda comment: comment.article_id),
+    'date': (Comment.date, lambda comment: comment.date.isoformat()),
+}
+
+
+def load_fields(query, field_map, fields, *always):
+    columns = dict.fromkeys(always + tuple(field_map[field][0] for field in fields))
+    return query.options(load_only(*columns))
+
+
+# SELECT только нужных колонок; автор присоединяется, только если его просили
+def select_article_fields(query, fields=None):
+    if fields is None:
+        return with_author(query)
+    query = load_fields(query, ARTICLE_FIELDS, fields, Article.id, Article.created_date)
+    if 'author' in fields:
+        query = query.options(joinedload(Article.author).load_only(User.name))
+    return query
+
+
+def select_comment_fields(query, fields=None):
+    if fields is None:
+        return query
+    return load_fields(query, COMMENT_FIELDS, fields, Comment.id, Comment.date)
+
+
+def article_to_json(article, fields=None):
+    if fields is not None:
+        return {field: ARTICLE_FIELDS[field][1](article) for field in fields}
+    return {
+        'id': article.id,
+        'title': article.title,
+        'text': article.text,
+        'category': article.category,
+        'author': article.author.name,
+        'author_id': article.user_id,
+        'comment_count': article.comment_count,
+        'created_date': article.created_date.isoformat()
+    }
+
+
+# для событий SSE: то же, что article_to_json, но с анонсом вместо текста
+def article_to_event(article):
+    data = article_to_json(article)
+    del data['text']
+    data['preview'] = article.preview
+    return data
+
+
+def comment_to_json(comment, fields=None):
+    if fields is not None:
+        return {field: COMMENT_FIELDS[field][1](comment) for field in fields}
+    return {
+        'id': comment.id,
+        'text': comment.text,
+        'author_name': comment.author_name,
+        'article_id': comment.article_id,
+        'date': comment.date.isoformat()
+    }
+
+
+def is_blank(value):
+    return not value or not isinstance(value, str) or not value.strip()
+
+
+def validate_article_payload(data):
+    errors = {}
+    if is_blank(data.get('title')):
+        errors['title'] = 'Title is required'
+    if is_blank(data.get('text')):
+        errors['text'] = 'Text is required'
+    if is_blank(data.get('category')):
+        errors['category'] = 'Category is required'
+    if not data.get('author_id'):
+        errors['author_id'] = 'Author ID is required'
+    return errors
+
+
+def validate_comment_payload(data):
+    errors = {}
+    if is_blank(data.get('text')):
+        errors['text'] = 'Text is required'
+    if is_blank(data.get('author_name')):
+        errors['author_name'] = 'Author name is required'
+    if not data.get('article_id'):
+        errors['article_id'] = 'Article ID is required'
+    return errors
@@ -0,0 +1,214 @@
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('fefnews.tasks')
+
+
+# Очередь фоновых задач в отдельном файле SQLite: обработчик запроса
+# только вставляет строку и сразу отвечает, а воркеры (flask tasks-worker)
+# забирают задачи, повторяют упавшие с экспоненциальной задержкой и
+# после TASKS_MAX_ATTEMPTS попыток оставляют их в статусе failed.
+# Взятая задача "арендуется" на TASKS_LEASE секунд: если воркер умер,
+# по истечении аренды её заберёт другой. TASKS_URL = memory:// выполняет
+# задачи сразу в запросе - для тестов и замеров.
+class TaskQueue:
+    def __init__(self):
+        self.handlers = {}
+        self.app = None
+        self.path = None
+        self.eager = False
+        self.max_attempts = 5
+        self.backoff = 10
+        self.backoff_max = 3600
+        self.lease = 300
+        self.poll_interval = 1
+        self.retention = 86400
+        self._local = threading.local()
+        self._stopping = False
+
+    def init_app(self, app):
+        self.app = app
+        url = app.config['TASKS_URL']
+        self.eager = url == 'memory://'
+        if not self.eager:
+            if not url.startswith('sqlite:///'):
+                raise ValueError(f'Unsupported task queue: {url}')
+            self.path = os.path.join(app.instance_path, url[len('sqlite:///'):])
+        self.max_attempts = app.config['TASKS_MAX_ATTEMPTS']
+        self.backoff = app.config['TASKS_BACKOFF']
+        self.backoff_max = app.config['TASKS_BACKOFF_MAX']
+        self.lease = app.config['TASKS_LEASE']
+        self.poll_interval = app.config['TASKS_POLL_INTERVAL']
+        self.retention = app.config['TASKS_RETENTION']
+
+    def task(self, name, max_attempts=None):
+        def decorator(func):
+            self.handlers[name] = (func, max_attempts)
+            return func
+        return decorator
+
+    # файл и таблица создаются при первом обращении, соединение своё
+    # у каждого потока и у каждого процесса после fork
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS task ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, '
+                         'payload TEXT NOT NULL, status TEXT NOT NULL, '
+                         'attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, '
+                         'run_at REAL NOT NULL, locked_until REAL, last_error TEXT, '
+                         'created REAL NOT NULL, finished REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_task_status_run_at ON task (status, run_at)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, name, *args, delay=0, **kwargs):
+        if name not in self.handlers:
+            raise KeyError(f'Unknown task: {name}')
+        if self.eager:
+            try:
+                self.execute(name, args, kwargs)
+            except Exception:
+                logger.exception('Task %s failed', name)
+            return None
+
+        now = time.time()
+        payload = json.dumps({'args': args, 'kwargs': kwargs}, ensure_ascii=False)
+        cursor = self._connect().execute(
+            'INSERT INTO task (name, payload, status, max_attempts, run_at, created) '
+            "VALUES (?, ?, 'queued', ?, ?, ?)",
+            (name, payload, self.handlers[name][1] or self.max_attempts, now + delay, now))
+        return cursor.lastrowid
+
+    def execute(self, name, args, kwargs):
+        func = self.handlers[name][0]
+        with self.app.app_context():
+            func(*args, **kwargs)
+
+    # одна задача забирается одним UPDATE ... RETURNING, поэтому два
+    # воркера не могут взять её одновременно
+    def claim(self):
+        now = time.time()
+        return self._connect().execute(
+            "UPDATE task SET status = 'running', attempts = attempts + 1, locked_until = ? "
+            'WHERE id = (SELECT id FROM task '
+            "WHERE (status = 'queued' AND run_at <= ?) OR (status = 'running' AND locked_until < ?) "
+            'ORDER BY run_at, id LIMIT 1) '
+            'RETURNING id, name, payload, attempts, max_attempts',
+            (now + self.lease, now, now)).fetchone()
+
+    def retry_delay(self, attempts):
+        delay = min(self.backoff_max, self.backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1)
+
+    def run_one(self):
+        row = self.claim()
+        if row is None:
+            return False
+        task_id, name, payload, attempts, max_attempts = row
+        conn = self._connect()
+
+        error = None
+        if name not in self.handlers:
+            error, attempts = f'Unknown task: {name}', max_attempts
+        elif attempts > max_attempts:
+            # воркер падал на этой задаче, не успевая записать результат
+            error = 'Lease expired on the last attempt'
+        else:
+            data = json.loads(payload)
+            try:
+                self.execute(name, data['args'], data['kwargs'])
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                logger.warning('Task %s #%s failed (attempt %s of %s)', name, task_id, attempts,
+                               max_attempts, exc_info=True)
+
+        now = time.time()
+        if error is None:
+            conn.execute("UPDATE task SET status = 'done', finished = ?, locked_until = NULL, "
+                         'last_error = NULL WHERE id = ?', (now, task_id))
+        elif attempts < max_attempts:
+            conn.execute("UPDATE task SET status = 'queued', run_at = ?, locked_until = NULL, "
+                         'last_error = ? WHERE id = ?',
+                         (now + self.retry_delay(attempts), error, task_id))
+        else:
+            logger.error('Task %s #%s gave up: %s', name, task_id, error)
+            conn.execute("UPDATE task SET status = 'failed', finished = ?, locked_until = NULL, "
+                         'last_error = ? WHERE id = ?', (now, error, task_id))
+        return True
+
+    def prune(self):
+        self._connect().execute("DELETE FROM task WHERE status = 'done' AND finished < ?",
+                                (time.time() - self.retention,))
+
+    def work(self, burst=False):
+        last_prune = 0
+        while not self._stopping:
+            if time.monotonic() - last_prune > 60:
+                self.prune()
+                last_prune = time.monotonic()
+            if self.run_one():
+                continue
+            if burst:
+                break
+            time.sleep(self.poll_interval)
+
+    def stop(self, *args):
+        self._stopping = True
+
+    # главный процесс только следит за воркерами и перезапускает упавших;
+    # по SIGTERM/SIGINT каждый воркер дорабатывает текущую задачу и выходит
+    def run_workers(self, processes=1, burst=False):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        if processes <= 1:
+            self.work(burst)
+            return
+
+        def start():
+            process = multiprocessing.Process(target=self._worker_main, args=(burst,))
+            process.start()
+            return process
+
+        workers = [start() for _ in range(processes)]
+        while workers:
+            time.sleep(0.5)
+            alive = [process for process in workers if process.is_alive()]
+            if not self._stopping and not burst:
+                alive += [start() for process in workers if not process.is_alive()]
+            elif self._stopping:
+                for process in alive:
+                    process.terminate()
+                for process in alive:
+                    process.join()
+                alive = []
+            workers = alive
+
+    def _worker_main(self, burst):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        from models import db
+        with self.app.app_context():
+            # соединения родителя после fork не используются
+            db.engine.dispose(close=False)
+        self.work(burst)
+
+    def stats(self):
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        if self.eager or not os.path.exists(self.path):
+            return counts
+        rows = self._connect().execute('SELECT status, count(*) FROM task GROUP BY status')
+        counts.update(rows.fetchall())
+        return counts
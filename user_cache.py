@@ -0,0 +1,68 @@
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+
+from cache import Cache
+from models import db, User
+
+
+# Колонки пользователя, которые кэшируются для current_user.
+# Хеш пароля в кэш не попадает: при обращении он догрузится из базы.
+FIELDS = ('id', 'name', 'email', 'created_date')
+
+
+# flask_login вызывает user_loader на каждом запросе с сессией. Данные
+# пользователя берутся из кэша и присоединяются к сессии через
+# merge(load=False) без SELECT; изменение или удаление записи User
+# через ORM сбрасывает ключ, а TTL ограничивает устаревание в остальных
+# случаях (например, при изменении другим воркером с кэшем в памяти).
+class UserCache:
+    def __init__(self):
+        self.backend = Cache('USER_CACHE_URL', 'USER_CACHE_SIZE')
+        self.ttl = 300
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.backend.init_app(app)
+        self.ttl = app.config['USER_CACHE_TTL']
+        event.listen(User, 'after_update', self._on_change)
+        event.listen(User, 'after_delete', self._on_change)
+
+    def _on_change(self, mapper, connection, user):
+        self.invalidate(user.id)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def invalidate(self, user_id):
+        self.backend.delete(f'user:{user_id}')
+
+    def get(self, user_id):
+        key = f'user:{user_id}'
+        data = self.backend.get(key)
+        self._count(data is not None)
+        if data is None:
+            user = db.session.get(User, user_id)
+            if user is not None:
+                self.backend.set(key, {field: getattr(user, field) for field in FIELDS}, ttl=self.ttl)
+            return user
+
+        user = User(**data)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else None
+            }
@@ -0,0 +1,112 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from metrics import Histogram
+
+logger = logging.getLogger('fefnews.writebehind')
+
+
+# Буфер отложенной записи для счётчиков на горячем пути: запрос только
+# увеличивает число в словаре под блокировкой, а фоновый поток раз в
+# interval секунд (или раньше, когда накопилось size приращений) отдаёт
+# всё накопленное в flush одной транзакцией. interval - граница потерь:
+# при падении процесса теряется не больше чем за столько секунд, при
+# обычной остановке остаток сбрасывается в atexit. interval = 0 - запись
+# сразу в запросе, как без буфера.
+class CounterBuffer:
+    def __init__(self, interval_key, size_key):
+        self.interval_key = interval_key
+        self.size_key = size_key
+        self.interval = 0
+        self.size = 1000
+        self.app = None
+        self.flush_func = None
+        self.counts = Counter()
+        self.pending = 0
+        self.oldest = None
+        self.flushes = 0
+        self.flushed = 0
+        self.errors = 0
+        self.flush_seconds = Histogram()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread_pid = None
+
+    def init_app(self, app, flush):
+        self.app = app
+        self.flush_func = flush
+        self.interval = app.config[self.interval_key]
+        self.size = app.config[self.size_key]
+        atexit.register(self.flush)
+
+    def add(self, key, amount=1):
+        if not self.interval:
+            self._write(Counter({key: amount}))
+            return
+        with self._lock:
+            self.counts[key] += amount
+            self.pending += amount
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            full = self.pending >= self.size
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    # поток заводится при первой записи и заново после fork
+    def _ensure_thread(self):
+        if self._thread_pid != os.getpid():
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                counts, self.counts = self.counts, Counter()
+                self.pending = 0
+                self.oldest = None
+            if counts:
+                self._write(counts)
+
+    def _write(self, counts):
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                self.flush_func(dict(counts))
+        except Exception:
+            logger.exception('Flush of %d counters failed, keeping them for the next attempt', len(counts))
+            with self._lock:
+                self.errors += 1
+                self.counts.update(counts)
+                self.pending += sum(counts.values())
+                if self.oldest is None:
+                    self.oldest = time.monotonic()
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.flushes += 1
+            self.flushed += sum(counts.values())
+            self.flush_seconds.observe(elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': self.pending,
+                'keys': len(self.counts),
+                'oldest_seconds': time.monotonic() - self.oldest if self.oldest is not None else 0,
+                'flushes': self.flushes,
+                'flushed': self.flushed,
+                'errors': self.errors,
+                'flush_seconds': self.flush_seconds,
+            }